@@ -0,0 +1,332 @@
+"""In-memory stand-in for the Supabase PostgREST API, for benchmarks.
+
+Implements the subset of PostgREST the CLI and API use: select with column
+lists and embedded child tables, eq/neq/gt/gte/lt/lte/like/ilike/in/is filters,
+or=(...)/and(...) groups, order, limit/offset, multi-row inserts, upserts on a
+conflict column, updates and deletes. Every request can be delayed by a fixed
+latency plus random jitter, and a fraction of requests can be failed with a 503
+to exercise the retry path.
+
+    python benchmarks/fake_postgrest.py --port 54321 --latency-ms 5 --error-rate 0.01
+
+then point the CLI at it with SUPABASE_URL=http://127.0.0.1:54321.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Query parameters that are not row filters
+RESERVED_PARAMS = ("select", "limit", "offset", "order", "on_conflict", "columns")
+
+def _timestamp():
+    now = time.time()
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}+00:00"
+
+def _split(text, separator=","):
+    """Split on separator outside parentheses and double quotes"""
+    parts, depth, current, quoted = [], 0, "", False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == separator and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def _compare_key(value):
+    """Sort/compare numbers numerically and everything else as text"""
+    if isinstance(value, bool) or value is None:
+        return (0, str(value))
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+def _coerce(value, like):
+    """Parse a filter operand into the type of the column value it is compared with"""
+    if isinstance(like, bool):
+        return value.lower() == "true"
+    if isinstance(like, (int, float)):
+        try:
+            return type(like)(value)
+        except ValueError:
+            return value
+    return value
+
+def match(row, column, expression):
+    """Whether row satisfies a PostgREST filter such as eq.5 or ilike.*asp*"""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, operand = expression.partition(".")
+    operand = operand.strip('"') if op != "in" else operand
+    value = row.get(column)
+
+    if op == "is":
+        result = value is None if operand == "null" else str(value).lower() == operand
+    elif op == "in":
+        items = [item.strip('"') for item in _split(operand.strip("()"))]
+        result = value is not None and str(value) in items
+    elif op in ("like", "ilike"):
+        pattern = re.escape(operand).replace(r"\*", ".*").replace("%", ".*")
+        flags = re.IGNORECASE if op == "ilike" else 0
+        result = value is not None and re.fullmatch(pattern, str(value), flags | re.DOTALL) is not None
+    elif value is None:
+        result = False
+    else:
+        left, right = _compare_key(value), _compare_key(_coerce(operand, value))
+        if op == "eq":
+            result = left == right
+        elif op == "neq":
+            result = left != right
+        elif op == "gt":
+            result = left > right
+        elif op == "gte":
+            result = left >= right
+        elif op == "lt":
+            result = left < right
+        elif op == "lte":
+            result = left <= right
+        else:
+            raise ValueError(f"Unsupported operator '{op}'")
+    return not result if negate else result
+
+def match_group(row, operator, body):
+    """Evaluate an or=(...) / and=(...) group, which may nest further groups"""
+    results = []
+    for part in _split(body.strip()[1:-1]):
+        if part.startswith(("and(", "or(", "not.and(", "not.or(")):
+            name, _, rest = part.partition("(")
+            result = match_group(row, name.replace("not.", ""), "(" + rest)
+            results.append(not result if name.startswith("not.") else result)
+        else:
+            column, _, expression = part.partition(".")
+            results.append(match(row, column, expression))
+    return all(results) if operator == "and" else any(results)
+
+class FakePostgrest:
+    """Threaded HTTP server holding tables in memory
+
+    latency_ms (+ up to jitter_ms) is slept before every request is answered and
+    error_rate is the probability that a request fails with a 503 instead.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tables = {}
+        self.requests = 0
+        self.injected_errors = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def reset(self):
+        with self._lock:
+            self.tables.clear()
+            self.requests = 0
+            self.injected_errors = 0
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.injected_errors = 0
+
+    def _delay_and_maybe_fail(self):
+        """Apply latency and error injection; True when the request should fail"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if delay:
+            time.sleep(delay / 1000)
+        return fail
+
+    # Table operations
+
+    def _filter(self, rows, params):
+        for key, value in params:
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and", "not.or", "not.and"):
+                negate = key.startswith("not.")
+                rows = [row for row in rows if match_group(row, key.replace("not.", ""), value) != negate]
+            else:
+                rows = [row for row in rows if match(row, key, value)]
+        return rows
+
+    def _project(self, row, select):
+        if not select or select == "*":
+            return dict(row)
+        projected = {}
+        for part in _split(select):
+            if "(" in part:
+                name, _, inner = part.partition("(")
+                name = name.split(":")[-1].strip()
+                children = [child for child in self.tables.get(name, []) if child.get("drug_id") == row.get("id")]
+                projected[name] = [self._project(child, inner[:-1]) for child in children]
+            elif part == "*":
+                projected.update(row)
+            else:
+                projected[part] = row.get(part)
+        return projected
+
+    def select(self, table, params):
+        options = dict(params)
+        with self._lock:
+            rows = self._filter(list(self.tables.get(table, [])), params)
+            if "order" in options:
+                for spec in reversed(options["order"].split(",")):
+                    column, _, direction = spec.partition(".")
+                    rows.sort(key=lambda row: _compare_key(row.get(column)), reverse=direction.startswith("desc"))
+            offset = int(options.get("offset", 0))
+            rows = rows[offset:]
+            if "limit" in options:
+                rows = rows[:int(options["limit"])]
+            return [self._project(row, options.get("select")) for row in rows]
+
+    def insert(self, table, rows, params, prefer):
+        options = dict(params)
+        created = []
+        with self._lock:
+            existing = self.tables.setdefault(table, [])
+            conflict = options.get("on_conflict") if "merge-duplicates" in prefer else None
+            for row in rows:
+                row = dict(row)
+                if conflict:
+                    current = next((item for item in existing if item.get(conflict) == row.get(conflict)), None)
+                    if current is not None:
+                        current.update(row)
+                        current["updated_at"] = _timestamp()
+                        created.append(dict(current))
+                        continue
+                row.setdefault("id", str(uuid.uuid4()))
+                row.setdefault("created_at", _timestamp())
+                row["updated_at"] = _timestamp()
+                existing.append(row)
+                created.append(dict(row))
+        return created
+
+    def update(self, table, changes, params):
+        with self._lock:
+            rows = self._filter(self.tables.get(table, []), params)
+            for row in rows:
+                row.update(changes)
+                row["updated_at"] = _timestamp()
+            return [dict(row) for row in rows]
+
+    def delete(self, table, params):
+        with self._lock:
+            rows = self._filter(self.tables.get(table, []), params)
+            doomed = {id(row) for row in rows}
+            self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in doomed]
+            return [dict(row) for row in rows]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without TCP_NODELAY every
+            # response would wait out the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"null")
+
+            def _handle(self, operation):
+                # Read the body first so a keep-alive connection stays in sync even on errors
+                body = self._body() if self.command in ("POST", "PATCH", "DELETE") else None
+                if server._delay_and_maybe_fail():
+                    return self._send(503, {"message": "Injected failure", "code": "503", "hint": None, "details": None})
+                url = urlparse(self.path)
+                table = url.path.rstrip("/").rsplit("/", 1)[-1]
+                params = parse_qsl(url.query, keep_blank_values=True)
+                try:
+                    status, result = operation(table, params, body)
+                except Exception as e:
+                    return self._send(400, {"message": str(e), "code": getattr(e, "code", "PGRST100"),
+                                            "hint": None, "details": None})
+                self._send(status, result)
+
+            def do_GET(self):
+                self._handle(lambda table, params, body: (200, server.select(table, params)))
+
+            def do_POST(self):
+                prefer = self.headers.get("Prefer", "")
+                self._handle(lambda table, params, body: (
+                    201, server.insert(table, body if isinstance(body, list) else [body], params, prefer)))
+
+            def do_PATCH(self):
+                self._handle(lambda table, params, body: (200, server.update(table, body or {}, params)))
+
+            def do_DELETE(self):
+                self._handle(lambda table, params, body: (200, server.delete(table, params)))
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random delay of up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503")
+    args = parser.parse_args(argv)
+
+    server = FakePostgrest(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake PostgREST listening on {server.url} (SUPABASE_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
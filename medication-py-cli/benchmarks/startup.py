@@ -0,0 +1,93 @@
+"""Startup-time benchmark for the medication CLI.
+
+Measures how long it takes to import ``medication_cli.cli`` and to run
+``medication-cli --help`` in a fresh interpreter, and checks that neither pulls
+in the supabase/httpx/flask stack. Exits non-zero when a threshold is exceeded
+so it can guard against startup regressions in CI.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --max-import-ms 150 --max-help-ms 250 -o startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded just to import the CLI or print its help
+HEAVY_MODULES = ("supabase", "postgrest", "httpx", "flask", "flask_restful")
+
+IMPORT_SNIPPET = "import medication_cli.cli"
+HELP_SNIPPET = "from medication_cli.cli import cli; cli(['--help'])"
+LOADED_SNIPPET = (
+    "import sys, medication_cli.cli; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+def _run(snippet):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=PACKAGE_ROOT,
+                            capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"'{snippet}' failed:\n{result.stderr}")
+    return elapsed, result.stdout
+
+def measure(snippet, runs):
+    """Wall time in milliseconds of running snippet in a fresh interpreter"""
+    _run(snippet)  # warm the filesystem and bytecode caches
+    samples = sorted(_run(snippet)[0] for _ in range(runs))
+    return {
+        "runs": runs,
+        "min_ms": round(samples[0], 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+def run_startup_benchmark(runs=10):
+    """Collect import and --help timings plus the heavy modules loaded at import"""
+    baseline = measure("pass", runs)
+    loaded = _run(LOADED_SNIPPET)[1].strip()
+    return {
+        "python": sys.version.split()[0],
+        "interpreter": baseline,
+        "import": measure(IMPORT_SNIPPET, runs),
+        "help": measure(HELP_SNIPPET, runs),
+        "heavy_modules_loaded": [m for m in loaded.split(",") if m],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per measurement")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument("--max-help-ms", type=float, help="Fail if the median --help time exceeds this")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = run_startup_benchmark(args.runs)
+    print(f"interpreter   median {results['interpreter']['median_ms']:.1f} ms")
+    print(f"import        median {results['import']['median_ms']:.1f} ms")
+    print(f"--help        median {results['help']['median_ms']:.1f} ms")
+    print(f"heavy modules loaded at import: {', '.join(results['heavy_modules_loaded']) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results["heavy_modules_loaded"]:
+        failures.append("heavy modules are imported at CLI startup")
+    if args.max_import_ms and results["import"]["median_ms"] > args.max_import_ms:
+        failures.append(f"import took {results['import']['median_ms']} ms (max {args.max_import_ms} ms)")
+    if args.max_help_ms and results["help"]["median_ms"] > args.max_help_ms:
+        failures.append(f"--help took {results['help']['median_ms']} ms (max {args.max_help_ms} ms)")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
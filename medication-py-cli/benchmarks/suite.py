@@ -0,0 +1,309 @@
+"""End-to-end benchmark suite for the medication CLI and API.
+
+Starts the in-memory PostgREST stand-in from fake_postgrest.py (with optional
+latency and error injection), points the package at it and measures:
+
+* import_drug_with_relationships throughput (drugs/s, rows/s, requests/drug)
+* `medication-cli search` latency (p50/p95/p99)
+* GET /medications?query= latency through the Flask resources (p50/p95/p99)
+* GET /medications/<id> requests per second with concurrent clients
+* CLI cold start (import and --help in a fresh interpreter)
+
+Results are written as JSON so runs can be compared over time:
+
+    python benchmarks/suite.py -o results/baseline.json
+    python benchmarks/suite.py --latency-ms 5 --error-rate 0.01 -o results/after.json --compare results/baseline.json
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PACKAGE_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+EXAMPLE_DRUG = os.path.join(PACKAGE_ROOT, "example_drug.json")
+
+# Medication names seeded for the search and detail benchmarks
+NAME_PARTS = ("acet", "amino", "ibu", "pro", "napro", "xen", "cef", "alex", "met", "formin",
+              "losar", "tan", "ator", "vastatin", "amlo", "dipine", "omep", "razole", "lis", "inopril")
+SEARCH_QUERIES = ("pro", "vastatin", "acetamino", "xen", "inopril", "zzz", "met", "a")
+
+# Metrics compared by --compare, with whether a higher value is better
+KEY_METRICS = (
+    (("import", "drugs_per_second"), True),
+    (("cli_search", "p50_ms"), False),
+    (("cli_search", "p99_ms"), False),
+    (("api_search", "p50_ms"), False),
+    (("api_search", "p99_ms"), False),
+    (("api_detail", "requests_per_second"), True),
+    (("cold_start", "import", "median_ms"), False),
+    (("cold_start", "help", "median_ms"), False),
+)
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_samples) + 0.5)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+def summarize_latency(samples_ms):
+    samples = sorted(samples_ms)
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "max_ms": round(samples[-1], 3) if samples else 0.0,
+    }
+
+def _timed(operation):
+    started = time.perf_counter()
+    operation()
+    return (time.perf_counter() - started) * 1000
+
+def make_drug(template, number):
+    drug = copy.deepcopy(template)
+    drug["name"] = f"{template['name']} {number}"
+    drug["slug"] = f"{template['slug']}-{number}"
+    return drug
+
+def seed_medications(fake, count, rng):
+    """Insert count medications straight into the fake backend"""
+    rows = []
+    for number in range(count):
+        name = "".join(rng.sample(NAME_PARTS, 2)).capitalize() + f" {number}"
+        rows.append({"name": name, "slug": name.lower().replace(" ", "-"), "generic_name": None,
+                     "drug_class": rng.choice(("NSAID", "Statin", "ACE inhibitor", "Antibiotic")),
+                     "description": None, "prescription_only": bool(number % 2)})
+    fake.insert("medications", rows, [], "")
+
+def bench_import(fake, drugs, batch_size):
+    """Import copies of example_drug.json one after another"""
+    from medication_cli.cli import import_drug_with_relationships
+
+    with open(EXAMPLE_DRUG) as f:
+        template = json.load(f)
+    rows_before = sum(len(rows) for rows in fake.tables.values())
+    fake.reset_counters()
+
+    samples, failed = [], 0
+    started = time.perf_counter()
+    for number in range(drugs):
+        drug = make_drug(template, number)
+        began = time.perf_counter()
+        if not import_drug_with_relationships(drug, batch_size=batch_size, verbose=False):
+            failed += 1
+        samples.append((time.perf_counter() - began) * 1000)
+    elapsed = time.perf_counter() - started
+
+    rows = sum(len(rows) for rows in fake.tables.values()) - rows_before
+    return {
+        "drugs": drugs,
+        "failed": failed,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "drugs_per_second": round(drugs / elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 2),
+        "requests_per_drug": round(fake.requests / drugs, 2),
+        "latency": summarize_latency(samples),
+    }
+
+def bench_cli_search(runs):
+    """medication-cli search, invoked in-process"""
+    from click.testing import CliRunner
+    from medication_cli.cli import cli
+
+    runner = CliRunner()
+    samples = []
+    for run in range(runs):
+        query = SEARCH_QUERIES[run % len(SEARCH_QUERIES)]
+        samples.append(_timed(lambda: runner.invoke(cli, ["search", query, "--limit", "10"])))
+    return summarize_latency(samples)
+
+def bench_api_search(runs, engine):
+    """GET /medications?query= through the Flask resources"""
+    from medication_cli.api import app
+
+    client = app.test_client()
+    samples = []
+    for run in range(runs):
+        query = SEARCH_QUERIES[run % len(SEARCH_QUERIES)]
+        url = f"/medications?query={query}&limit=10&engine={engine}"
+        samples.append(_timed(lambda: client.get(url)))
+    return summarize_latency(samples)
+
+def bench_api_detail(fake, seconds, concurrency):
+    """GET /medications/<id> from concurrent clients for a fixed time"""
+    from medication_cli.api import app
+
+    ids = [row["id"] for row in fake.tables.get("medications", [])]
+    deadline = time.perf_counter() + seconds
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    samples = [[] for _ in range(concurrency)]
+
+    def worker(slot):
+        client = app.test_client()
+        rng = random.Random(slot)
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            response = client.get(f"/medications/{rng.choice(ids)}")
+            samples[slot].append((time.perf_counter() - began) * 1000)
+            counts[slot] += 1
+            if response.status_code != 200:
+                errors[slot] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": sum(counts),
+        "errors": sum(errors),
+        "requests_per_second": round(sum(counts) / elapsed, 2),
+        "latency": summarize_latency([sample for slot in samples for sample in slot]),
+    }
+
+def bench_cold_start(runs):
+    from startup import run_startup_benchmark
+    return run_startup_benchmark(runs)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PACKAGE_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(args):
+    fake = FakePostgrest(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, seed=args.seed).start()
+    # Set before medication_cli is imported, which is when it reads SUPABASE_URL
+    os.environ["SUPABASE_URL"] = fake.url
+
+    from medication_cli import api
+    if not args.cache:
+        # Measure the backend path rather than cache hits
+        api.response_cache.max_size = 0
+
+    rng = random.Random(args.seed)
+    results = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "config": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "cache": args.cache,
+            "drugs": args.drugs,
+            "medications": args.medications,
+            "runs": args.runs,
+            "concurrency": args.concurrency,
+        },
+    }
+    try:
+        print(f"Fake PostgREST at {fake.url} (latency {args.latency_ms} ms, error rate {args.error_rate})")
+        results["import"] = bench_import(fake, args.drugs, args.batch_size)
+        print(f"import         {results['import']['drugs_per_second']:.1f} drugs/s, "
+              f"{results['import']['rows_per_second']:.1f} rows/s, "
+              f"{results['import']['requests_per_drug']} requests/drug")
+
+        seed_medications(fake, args.medications, rng)
+        results["cli_search"] = bench_cli_search(args.runs)
+        _print_latency("cli search", results["cli_search"])
+        results["api_search"] = bench_api_search(args.runs, "db")
+        _print_latency("api search", results["api_search"])
+
+        api.search_index.load()
+        results["api_search_index"] = bench_api_search(args.runs, "index")
+        _print_latency("api search (index)", results["api_search_index"])
+
+        results["api_detail"] = bench_api_detail(fake, args.seconds, args.concurrency)
+        print(f"api detail     {results['api_detail']['requests_per_second']:.1f} req/s "
+              f"with {args.concurrency} clients, {results['api_detail']['errors']} errors")
+
+        if not args.skip_cold_start:
+            results["cold_start"] = bench_cold_start(args.cold_start_runs)
+            print(f"cold start     import {results['cold_start']['import']['median_ms']:.1f} ms, "
+                  f"--help {results['cold_start']['help']['median_ms']:.1f} ms")
+
+        results["backend"] = {"requests": fake.requests, "injected_errors": fake.injected_errors}
+    finally:
+        fake.stop()
+    return results
+
+def _print_latency(label, latency):
+    print(f"{label:<14} p50 {latency['p50_ms']:.2f} ms, p95 {latency['p95_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms")
+
+def _lookup(results, path):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+def compare(current, previous):
+    """Print the change of each key metric against an earlier run"""
+    print(f"\nCompared with {previous.get('revision') or 'previous run'} ({previous.get('timestamp')}):")
+    for path, higher_is_better in KEY_METRICS:
+        before, after = _lookup(previous, path), _lookup(current, path)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        better = change > 0 if higher_is_better else change < 0
+        verdict = "better" if better else "worse" if change else "same"
+        print(f"  {'.'.join(path):<32} {before:>10} -> {after:>10} ({change:+.1f}%, {verdict})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every backend request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random backend latency of up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of backend requests failed with a 503")
+    parser.add_argument("--drugs", type=int, default=100, help="Drugs imported by the import benchmark")
+    parser.add_argument("--batch-size", type=int, default=500, help="Child rows per insert request during import")
+    parser.add_argument("--medications", type=int, default=2000, help="Medications seeded for search and detail")
+    parser.add_argument("--runs", type=int, default=200, help="Requests per latency benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of the detail throughput benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients in the detail benchmark")
+    parser.add_argument("--cache", action="store_true", help="Keep the API response cache enabled")
+    parser.add_argument("--cold-start-runs", type=int, default=5, help="Fresh interpreters per cold start measurement")
+    parser.add_argument("--skip-cold-start", action="store_true", help="Skip the CLI cold start measurement")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generated data and error injection")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args)
+
+    if args.output:
+        directory = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
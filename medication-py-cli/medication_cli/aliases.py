@@ -0,0 +1,187 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .drug_index import DrugIndex, fetch_rows
+from .search_index import normalize
+
+# Drug fields that name a drug, from strongest to weakest claim on a shared alias
+DRUG_ALIAS_FIELDS = ("name", "generic", "slug")
+
+# Priority of international names, weaker than every field above
+INTERNATIONAL_PRIORITY = len(DRUG_ALIAS_FIELDS)
+
+# Columns of the medications table that name a medication, strongest first
+MEDICATION_ALIAS_FIELDS = ("name", "generic_name")
+
+def _quote(value: Any) -> str:
+    """PostgREST filter operand, double-quoted so commas and parentheses stay literal"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def name_or_id_filter(query: str, medication_id: Any) -> str:
+    """or=(...) filter matching names containing query plus the medication an alias resolved to"""
+    return f"name.ilike.{_quote(f'%{query}%')},id.eq.{_quote(medication_id)}"
+
+class _Claims:
+    """Keys claimed by owners at a priority; each key resolves to its strongest claim
+
+    Ties go to the smallest owner id so lookups do not depend on load order.
+    """
+
+    def __init__(self):
+        self._claims: Dict[str, Dict[str, int]] = {}
+        self._best: Dict[str, str] = {}
+        self._owned: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._best)
+
+    def clear(self):
+        self._claims.clear()
+        self._best.clear()
+        self._owned.clear()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._best.get(key)
+
+    def add(self, owner: str, keys: Iterable[Tuple[str, int]]):
+        """Claim (key, priority) pairs for owner"""
+        for key, priority in keys:
+            if not key:
+                continue
+            claims = self._claims.setdefault(key, {})
+            if priority < claims.get(owner, priority + 1):
+                claims[owner] = priority
+            self._owned.setdefault(owner, set()).add(key)
+            self._settle(key)
+
+    def remove(self, owner: str):
+        for key in self._owned.pop(owner, ()):
+            claims = self._claims.get(key, {})
+            claims.pop(owner, None)
+            if not claims:
+                self._claims.pop(key, None)
+            self._settle(key)
+
+    def _settle(self, key: str):
+        claims = self._claims.get(key)
+        if claims:
+            self._best[key] = min(claims, key=lambda owner: (claims[owner], owner))
+        else:
+            self._best.pop(key, None)
+
+class AliasIndex(DrugIndex):
+    """Hash index from every name a drug goes by to its canonical drug and medication
+
+    Drug names, generic names, slugs and international names map to the drug id;
+    medication names and generic names map to the medication id. Resolving a
+    name is a handful of dictionary lookups, so "Paracetamol" finds the
+    Acetaminophen medication without any query.
+    """
+
+    label = "alias index"
+    child_table = "international_names"
+    child_columns = ("country", "name")
+
+    def __init__(self, refresh_interval: float = 300):
+        super().__init__(refresh_interval)
+        self._drug_aliases = _Claims()
+        self._medication_aliases = _Claims()
+        self._medication_names: Dict[str, Optional[str]] = {}
+
+    def _clear(self):
+        self._drug_aliases.clear()
+
+    def _add_drug(self, drug: Dict[str, Any], rows: List[Dict[str, Any]]):
+        keys = [(normalize(drug.get(field)), priority) for priority, field in enumerate(DRUG_ALIAS_FIELDS)]
+        keys += [(normalize(row.get("name")), INTERNATIONAL_PRIORITY) for row in rows]
+        self._drug_aliases.add(str(drug["id"]), keys)
+
+    def _remove_drug(self, drug_id: str):
+        self._drug_aliases.remove(drug_id)
+
+    def _fetch_medications(self, client) -> List[Dict[str, Any]]:
+        if client is None:
+            from .supabase_client import supabase as client
+        return fetch_rows(client, "medications", ("id",) + MEDICATION_ALIAS_FIELDS)
+
+    def _replace_medications(self, rows: List[Dict[str, Any]]):
+        with self._lock:
+            self._medication_aliases.clear()
+            self._medication_names.clear()
+            for row in rows:
+                self._add_medication(row)
+
+    def _add_medication(self, row: Dict[str, Any]):
+        medication_id = str(row["id"])
+        self._medication_names[medication_id] = row.get("name")
+        self._medication_aliases.add(medication_id, [
+            (normalize(row.get(field)), priority) for priority, field in enumerate(MEDICATION_ALIAS_FIELDS)])
+
+    def load(self, client=None):
+        """(Re)build the whole index, medications first"""
+        self._replace_medications(self._fetch_medications(client))
+        super().load(client)
+
+    def refresh(self, client=None) -> Dict[str, int]:
+        """Re-read medication names and bring the drug aliases up to date incrementally"""
+        medications = self._fetch_medications(client)
+        self._replace_medications(medications)
+        return {**super().refresh(client), "medications": len(medications)}
+
+    def upsert_medication(self, row: Dict[str, Any]):
+        """Index a medication's names right after it was written to the database"""
+        if not row or row.get("id") is None:
+            return
+        with self._lock:
+            self._medication_aliases.remove(str(row["id"]))
+            self._add_medication(row)
+
+    def remove_medication(self, medication_id: Any):
+        with self._lock:
+            self._medication_aliases.remove(str(medication_id))
+            self._medication_names.pop(str(medication_id), None)
+
+    def resolve(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Canonical drug and medication for any name they go by, or None when it is unknown
+
+        A name that only names a drug resolves to the medication carrying that
+        drug's name or generic name.
+        """
+        key = normalize(name)
+        if not key:
+            return None
+
+        with self._lock:
+            drug_id = self._drug_aliases.get(key)
+            drug = self._drugs.get(drug_id) if drug_id is not None else None
+            medication_id = self._medication_aliases.get(key)
+            if medication_id is None and drug is not None:
+                for field in ("name", "generic"):
+                    medication_id = self._medication_aliases.get(normalize(drug.get(field)))
+                    if medication_id is not None:
+                        break
+            if drug is None and medication_id is None:
+                return None
+            return {
+                "input": name,
+                "drug_id": drug.get("id") if drug else None,
+                "medication_id": medication_id,
+                "name": drug.get("name") if drug else self._medication_names.get(medication_id),
+            }
+
+    def medication_id(self, name: Optional[str]) -> Optional[str]:
+        """Id of the medication a name resolves to, or None"""
+        resolved = self.resolve(name)
+        return resolved["medication_id"] if resolved else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **super().stats(),
+                "drug_aliases": len(self._drug_aliases),
+                "medications": len(self._medication_names),
+                "medication_aliases": len(self._medication_aliases),
+            }
+
+# Shared index used by the API and CLI; refreshed in the background after this many seconds
+alias_index = AliasIndex(refresh_interval=float(os.getenv("MEDICATION_ALIAS_REFRESH", "300")))
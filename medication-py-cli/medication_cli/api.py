@@ -1,47 +1,249 @@
 
-from flask import Flask, request
+from flask import Flask, Response, g, request
 from flask_restful import Resource, Api, reqparse
-import json
+import os
 import time
+from . import metrics
 from .supabase_client import supabase
+from .search_index import search_index
+from .interactions import interaction_index, parse_medications
+from .aliases import alias_index, name_or_id_filter
+from .imprints import imprint_index, normalize_code, DEFAULT_LIMIT as IMPRINT_LIMIT
+from .cache import TTLCache
+from .singleflight import SingleFlight
+from .retry import execute, breaker, is_retryable, is_rejection, CircuitOpenError, DeadlineExceeded
+from .pagination import (parse_fields, select_columns, project, decode_cursor, apply_page,
+                         clamp_limit, compute_etag, etag_matches, page_headers)
+from .batch import (parse_ids, parse_items, item_result, summarize, create_flow, update_flow, run_flow,
+                    INSERT, UPDATE)
 
 app = Flask(__name__)
 api = Api(app)
 
-# Define timeouts for database operations
+# Deadline budget for a database operation, shared by all of its retries
 DB_QUERY_TIMEOUT = 10  # seconds
 
+# Default engine for ?query= searches: "db" (ilike against Supabase) or "index" (in-process)
+SEARCH_ENGINE = os.getenv("MEDICATION_SEARCH_ENGINE", "db")
+
+# Cache for detail lookups and list/search responses (set the size to 0 to disable)
+response_cache = TTLCache(
+    max_size=int(os.getenv("MEDICATION_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MEDICATION_CACHE_TTL", "60"))
+)
+
+# PostgREST/PostgreSQL error codes (or code prefixes) caused by the request itself, answered
+# with 400: malformed requests, unknown columns, invalid values and violated constraints
+BAD_REQUEST_CODES = ("PGRST1", "PGRST204", "42703", "22", "23")
+
+# Identical list/detail reads running at the same time share one Supabase query
+read_coalescer = SingleFlight(enabled=os.getenv("MEDICATION_COALESCE_READS", "1") != "0")
+
+# Local SQLite read replica, set up by enable_replica() (or MEDICATION_REPLICA=1)
+replica = None
+
+def enable_replica(start_sync=True):
+    """Serve reads from the local replica while it is within its staleness bound"""
+    global replica
+    from .replica import Replica
+    if replica is None:
+        replica = Replica()
+    if start_sync:
+        replica.start_background_sync()
+    return replica
+
+def use_replica(table):
+    return replica is not None and replica.is_fresh(table)
+
+def can_fall_back(table, e):
+    """Whether a failed Supabase read may be answered from the replica, however stale"""
+    if replica is None or not replica.has_data(table):
+        return False
+    return isinstance(e, (CircuitOpenError, DeadlineExceeded)) or is_retryable(e)
+
+def read_rows(table, remote, local):
+    """Rows from the replica while it is fresh, otherwise from Supabase with the replica as fallback"""
+    if use_replica(table):
+        return local()
+    try:
+        return remote()
+    except Exception as e:
+        if can_fall_back(table, e):
+            return local()
+        raise
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.record_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+def component_metrics():
+    """Cache, circuit breaker and index state as (name, type, help, labels, value) samples"""
+    cache = response_cache.stats()
+    yield ("medication_cache_hits_total", "counter", "Response cache hits", {"cache": "response"}, cache["hits"])
+    yield ("medication_cache_misses_total", "counter", "Response cache misses", {"cache": "response"}, cache["misses"])
+    yield ("medication_cache_hit_ratio", "gauge", "Share of response cache lookups that were hits",
+           {"cache": "response"}, cache["hit_rate"])
+    yield ("medication_cache_entries", "gauge", "Entries held by the response cache", {"cache": "response"}, cache["size"])
+    yield ("medication_cache_evictions_total", "counter", "Entries evicted to stay within the cache size",
+           {"cache": "response"}, cache["evictions"])
+    yield ("medication_cache_stale_skips_total", "counter", "Reads not cached because a write invalidated the cache meanwhile",
+           {"cache": "response"}, cache["stale_skips"])
+    
+    state = breaker.stats()
+    yield ("medication_circuit_breaker_open", "gauge", "1 while the circuit breaker rejects calls", {},
+           1 if state["state"] == breaker.OPEN else 0)
+    yield ("medication_circuit_breaker_trips_total", "counter", "Times the circuit breaker opened", {}, state["trips"])
+    yield ("medication_circuit_breaker_rejected_total", "counter", "Calls rejected while the circuit was open", {},
+           state["rejected"])
+    
+    coalescing = read_coalescer.stats()
+    yield ("medication_coalesced_reads_total", "counter",
+           "Reads that shared an identical in-flight Supabase query instead of making their own", {},
+           coalescing["saved_calls"])
+    yield ("medication_coalescer_backend_calls_total", "counter",
+           "Supabase queries made by list/detail reads after coalescing", {}, coalescing["backend_calls"])
+    
+    yield ("medication_search_index_documents", "gauge", "Rows held by the in-process search index", {},
+           len(search_index))
+    if replica is not None:
+        for table, info in replica.stats()["tables"].items():
+            if info["age_seconds"] is not None:
+                yield ("medication_replica_age_seconds", "gauge", "Seconds since the replica table was last synced",
+                       {"table": table}, info["age_seconds"])
+
+metrics.registry.register_collector(component_metrics)
+
+def resolve_alias(query):
+    """Id of the medication a search query names through the alias index, if it is loaded"""
+    if not query:
+        return None
+    if not alias_index.is_warm:
+        alias_index.warm_in_background()
+        return None
+    alias_index.refresh_if_stale()
+    return alias_index.medication_id(query)
+
+def with_alias_first(rows, alias_id, limit):
+    """Put the medication an alias resolved to at the front of in-process search results"""
+    if alias_id is None or any(str(row.get("id")) == alias_id for row in rows):
+        return rows
+    row = search_index.get(alias_id)
+    return ([row] + rows)[:limit] if row is not None else rows
+
+def mirror_to_replica(row=None, removed_id=None):
+    """Apply an API write to the replica right away so later reads see it"""
+    if replica is None:
+        return
+    if row is not None:
+        replica.upsert("medications", [row])
+    if removed_id is not None:
+        replica.remove("medications", [removed_id])
+
+def record_write(row):
+    """Bring the indexes, replica and cache up to date with a medication row just written"""
+    search_index.upsert(row)
+    alias_index.upsert_medication(row)
+    mirror_to_replica(row)
+    invalidate_medication(row["id"])
+
+def record_delete(medication_id):
+    """Remove a medication just deleted from the indexes, replica and cache"""
+    search_index.remove(medication_id)
+    alias_index.remove_medication(medication_id)
+    mirror_to_replica(removed_id=medication_id)
+    invalidate_medication(medication_id)
+
+def perform_batch_operation(operation, payload):
+    """Run one operation of a batch flow against Supabase"""
+    if operation == INSERT:
+        # An insert is not idempotent, so it is only retried when the request never reached the server
+        return execute(supabase.table("medications").insert(payload).execute,
+                       deadline=DB_QUERY_TIMEOUT, idempotent=False).data
+    if operation == UPDATE:
+        update_data, ids = payload
+        return execute(supabase.table("medications").update(update_data).in_("id", ids).execute,
+                       deadline=DB_QUERY_TIMEOUT).data
+    record_write(payload)
+
+def invalidate_medication(medication_id=None):
+    """Drop cached responses that a write to the medications table may have changed"""
+    if medication_id is not None:
+        response_cache.invalidate(("detail", str(medication_id)))
+        read_coalescer.forget(lambda key: key == ("detail", str(medication_id)))
+    response_cache.invalidate_where(lambda key: key[0] == "list")
+    read_coalescer.forget(lambda key: key[0] == "list")
+
+def error_response(e):
+    """Map an exception raised by a database operation to an error response"""
+    if isinstance(e, CircuitOpenError):
+        return {"error": str(e)}, 503
+    if isinstance(e, DeadlineExceeded) or is_retryable(e):
+        return {"error": "Database query timed out. Please try again."}, 504
+    if is_rejection(e) and str(e.code).startswith(BAD_REQUEST_CODES):
+        return {"error": e.message or str(e)}, 400
+    return {"error": str(e)}, 500
+
+def conditional_response(data, headers):
+    """Return 304 Not Modified when the client's If-None-Match matches the ETag"""
+    if etag_matches(request.headers.get('If-None-Match'), headers["ETag"]):
+        return '', 304, headers
+    return data, 200, headers
+
 class MedicationList(Resource):
     def get(self):
         try:
-            start_time = time.time()
-            
             # Get query parameter for search
             query = request.args.get('query', '')
-            limit = request.args.get('limit', 10, type=int)
-            
-            # Add timeout check for long-running queries
-            while time.time() - start_time < DB_QUERY_TIMEOUT:
-                try:
-                    if query:
-                        # Optimize search query by using ilike with indexed column
-                        response = supabase.table("medications").select("*").ilike("name", f"%{query}%").limit(limit).execute()
-                    else:
-                        # Get all medications (with limit)
-                        response = supabase.table("medications").select("*").limit(limit).execute()
-                    
-                    return response.data, 200
-                except Exception as e:
-                    if "timeout" in str(e).lower():
-                        # Small pause before retry
-                        time.sleep(0.5)
-                        continue
-                    raise e
-                    
-            # If we get here, we've timed out
-            return {"error": "Database query timed out. Please try again."}, 504
+            limit = clamp_limit(request.args.get('limit', 10, type=int))
+            engine = request.args.get('engine', SEARCH_ENGINE)
+            
+            try:
+                fields = parse_fields(request.args.get('fields'))
+                after = decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            
+            # A query naming a medication by a brand, generic or international name
+            # also matches that medication (the alias index loads in the background)
+            alias_id = resolve_alias(query)
+            
+            # Answer from the in-process index when asked to and it is warm
+            # (ranked results, so there is no cursor to continue from)
+            if query and engine == 'index' and search_index.is_warm and after is None:
+                search_index.refresh_if_stale()
+                rows = with_alias_first(search_index.search(query, limit), alias_id, limit)
+                rows = [project(row, fields) for row in rows]
+                return conditional_response(rows, {"ETag": compute_etag(rows)})
+            
+            cache_key = ("list", query, limit, select_columns(fields), after, alias_id)
+            rows = response_cache.get(cache_key)
+            if rows is None:
+                generation = response_cache.generation
+                builder = supabase.table("medications").select(select_columns(fields))
+                if alias_id is not None:
+                    builder = builder.or_(name_or_id_filter(query, alias_id))
+                elif query:
+                    # Optimize search query by using ilike with indexed column
+                    builder = builder.ilike("name", f"%{query}%")
+                
+                # Keyset pagination: ordered by id, starting after the cursor
+                rows = read_coalescer.do(cache_key, lambda: read_rows(
+                    "medications",
+                    lambda: execute(apply_page(builder, after, limit).execute, deadline=DB_QUERY_TIMEOUT).data,
+                    lambda: [project(row, fields) for row in replica.search("medications", query, limit, after)]))
+                response_cache.set(cache_key, rows, generation=generation)
+            
+            return conditional_response(rows, page_headers(rows, limit, request.path, request.args.to_dict()))
         except Exception as e:
-            return {"error": str(e)}, 500
+            return error_response(e)
     
     def post(self):
         try:
@@ -64,68 +266,54 @@ class MedicationList(Resource):
                 "prescription_only": args.get('prescription_only', True)
             }
             
-            # Insert into medications table with timeout handling
-            start_time = time.time()
-            while time.time() - start_time < DB_QUERY_TIMEOUT:
-                try:
-                    response = supabase.table("medications").insert(drug_data).execute()
-                    
-                    if response.data and len(response.data) > 0:
-                        return {"id": response.data[0]["id"], "message": f"Successfully added {args['name']}"}, 201
-                    else:
-                        return {"error": f"Failed to add {args['name']}"}, 400
-                except Exception as e:
-                    if "timeout" in str(e).lower():
-                        time.sleep(0.5)
-                        continue
-                    raise e
-                    
-            return {"error": "Operation timed out. Please try again."}, 504
+            # Insert into medications table; an insert is not idempotent, so it is
+            # only retried when the request never reached the server
+            response = execute(supabase.table("medications").insert(drug_data).execute,
+                               deadline=DB_QUERY_TIMEOUT, idempotent=False)
+            
+            if response.data and len(response.data) > 0:
+                record_write(response.data[0])
+                return {"id": response.data[0]["id"], "message": f"Successfully added {args['name']}"}, 201
+            else:
+                return {"error": f"Failed to add {args['name']}"}, 400
         except Exception as e:
-            return {"error": str(e)}, 500
+            return error_response(e)
 
 class MedicationDetail(Resource):
     def get(self, medication_id):
         try:
-            start_time = time.time()
-            while time.time() - start_time < DB_QUERY_TIMEOUT:
-                try:
-                    response = supabase.table("medications").select("*").eq("id", medication_id).limit(1).execute()
-                    
-                    if response.data and len(response.data) > 0:
-                        return response.data[0], 200
-                    else:
-                        return {"error": "Medication not found"}, 404
-                except Exception as e:
-                    if "timeout" in str(e).lower():
-                        time.sleep(0.5)
-                        continue
-                    raise e
-                    
-            return {"error": "Operation timed out. Please try again."}, 504
+            cache_key = ("detail", medication_id)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+            generation = response_cache.generation
+            
+            rows = read_coalescer.do(cache_key, lambda: read_rows(
+                "medications",
+                lambda: execute(supabase.table("medications").select("*").eq("id", medication_id).limit(1).execute,
+                                deadline=DB_QUERY_TIMEOUT).data,
+                lambda: replica.get_many("medications", [medication_id])))
+            
+            if rows and len(rows) > 0:
+                response_cache.set(cache_key, rows[0], generation=generation)
+                return rows[0], 200
+            else:
+                return {"error": "Medication not found"}, 404
         except Exception as e:
-            return {"error": str(e)}, 500
+            return error_response(e)
     
     def delete(self, medication_id):
         try:
-            start_time = time.time()
-            while time.time() - start_time < DB_QUERY_TIMEOUT:
-                try:
-                    response = supabase.table("medications").delete().eq("id", medication_id).execute()
-                    
-                    if response.data and len(response.data) > 0:
-                        return {"message": "Medication deleted successfully"}, 200
-                    else:
-                        return {"error": "Failed to delete medication or medication not found"}, 404
-                except Exception as e:
-                    if "timeout" in str(e).lower():
-                        time.sleep(0.5)
-                        continue
-                    raise e
-                    
-            return {"error": "Operation timed out. Please try again."}, 504
+            response = execute(supabase.table("medications").delete().eq("id", medication_id).execute,
+                               deadline=DB_QUERY_TIMEOUT)
+            
+            if response.data and len(response.data) > 0:
+                record_delete(medication_id)
+                return {"message": "Medication deleted successfully"}, 200
+            else:
+                return {"error": "Failed to delete medication or medication not found"}, 404
         except Exception as e:
-            return {"error": str(e)}, 500
+            return error_response(e)
             
     def put(self, medication_id):
         try:
@@ -161,29 +349,195 @@ class MedicationDetail(Resource):
             if not update_data:
                 return {"error": "No fields provided for update"}, 400
                 
-            # Update medication in database with timeout handling
-            start_time = time.time()
-            while time.time() - start_time < DB_QUERY_TIMEOUT:
-                try:
-                    response = supabase.table("medications").update(update_data).eq("id", medication_id).execute()
-                    
-                    if response.data and len(response.data) > 0:
-                        return {"message": "Medication updated successfully", "medication": response.data[0]}, 200
+            # Update medication in database with retries and a deadline
+            response = execute(supabase.table("medications").update(update_data).eq("id", medication_id).execute,
+                               deadline=DB_QUERY_TIMEOUT)
+            
+            if response.data and len(response.data) > 0:
+                record_write(response.data[0])
+                return {"message": "Medication updated successfully", "medication": response.data[0]}, 200
+            else:
+                return {"error": "Failed to update medication or medication not found"}, 404
+        except Exception as e:
+            return error_response(e)
+
+class MedicationBatch(Resource):
+    def get(self):
+        try:
+            try:
+                ids = parse_ids(request.args.get('ids', ''))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            
+            # Serve what we can from the cache and fetch the rest with one in(...) query
+            results, missing = [], []
+            generation = response_cache.generation
+            for index, medication_id in enumerate(ids):
+                cached = response_cache.get(("detail", medication_id))
+                if cached is not None:
+                    results.append(item_result(index, 200, id=medication_id, medication=cached))
+                else:
+                    missing.append((index, medication_id))
+            
+            if missing:
+                missing_ids = [medication_id for _, medication_id in missing]
+                builder = supabase.table("medications").select("*").in_("id", missing_ids)
+                rows = read_rows("medications",
+                                 lambda: execute(builder.execute, deadline=DB_QUERY_TIMEOUT).data,
+                                 lambda: replica.get_many("medications", missing_ids))
+                found = {str(row["id"]): row for row in rows or []}
+                for index, medication_id in missing:
+                    row = found.get(medication_id)
+                    if row is not None:
+                        response_cache.set(("detail", medication_id), row, generation=generation)
+                        results.append(item_result(index, 200, id=medication_id, medication=row))
                     else:
-                        return {"error": "Failed to update medication or medication not found"}, 404
-                except Exception as e:
-                    if "timeout" in str(e).lower():
-                        time.sleep(0.5)
-                        continue
-                    raise e
-                    
-            return {"error": "Operation timed out. Please try again."}, 504
+                        results.append(item_result(index, 404, id=medication_id, error="Medication not found"))
+            
+            return summarize(results), 200
+        except Exception as e:
+            return error_response(e)
+    
+    def post(self):
+        try:
+            try:
+                items = parse_items(request.get_json(silent=True))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            
+            return run_flow(create_flow(items, error_response), perform_batch_operation), 200
+        except Exception as e:
+            return error_response(e)
+    
+    def put(self):
+        try:
+            try:
+                items = parse_items(request.get_json(silent=True))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            
+            return run_flow(update_flow(items, error_response), perform_batch_operation), 200
         except Exception as e:
-            return {"error": str(e)}, 500
+            return error_response(e)
+
+class InteractionCheck(Resource):
+    def _check(self, value):
+        try:
+            medications = parse_medications(value)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        
+        try:
+            # Built on first use, then kept current by incremental background refreshes
+            interaction_index.ensure_loaded()
+            interaction_index.refresh_if_stale()
+            return interaction_index.check(medications), 200
+        except Exception as e:
+            return error_response(e)
+    
+    def get(self):
+        return self._check(request.args.get('medications', ''))
+    
+    def post(self):
+        return self._check(request.get_json(silent=True))
+
+class InteractionIndexStatus(Resource):
+    def get(self):
+        return interaction_index.stats(), 200
+
+class MedicationByName(Resource):
+    def get(self, name):
+        try:
+            # Brand, generic and international names all resolve to the canonical medication
+            alias_index.ensure_loaded()
+            alias_index.refresh_if_stale()
+            medication_id = alias_index.medication_id(name)
+        except Exception as e:
+            return error_response(e)
+        
+        if medication_id is None:
+            return {"error": f"No medication found with the name '{name}'"}, 404
+        return MedicationDetail().get(medication_id)
+
+class AliasIndexStatus(Resource):
+    def get(self):
+        return alias_index.stats(), 200
+
+class Imprints(Resource):
+    def get(self):
+        code = request.args.get('code', '')
+        if not normalize_code(code):
+            return {"error": "Query parameter 'code' with at least one letter or digit is required"}, 400
+        limit = clamp_limit(request.args.get('limit', IMPRINT_LIMIT, type=int))
+        
+        try:
+            # Built on first use, then kept current by incremental background refreshes
+            imprint_index.ensure_loaded()
+            imprint_index.refresh_if_stale()
+            results = imprint_index.lookup(code, color=request.args.get('color'),
+                                           shape=request.args.get('shape'), limit=limit)
+            return {"code": code, "results": results, "count": len(results)}, 200
+        except Exception as e:
+            return error_response(e)
+
+class ImprintIndexStatus(Resource):
+    def get(self):
+        return imprint_index.stats(), 200
+
+class ReplicaStatus(Resource):
+    def get(self):
+        if replica is None:
+            return {"enabled": False}, 200
+        return {"enabled": True, **replica.stats()}, 200
+
+class Metrics(Resource):
+    def get(self):
+        # Prometheus text format rather than JSON
+        return Response(metrics.registry.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+class Health(Resource):
+    def get(self):
+        # Circuit breaker state for monitoring; 503 while calls are being rejected
+        state = breaker.stats()
+        status = 503 if state["state"] == breaker.OPEN else 200
+        return {"status": "ok" if status == 200 else "degraded", "circuit_breaker": state}, status
+
+class SearchIndexStatus(Resource):
+    def get(self):
+        return search_index.stats(), 200
+
+class CacheStatus(Resource):
+    def get(self):
+        return response_cache.stats(), 200
+
+class CoalescingStatus(Resource):
+    def get(self):
+        return read_coalescer.stats(), 200
 
 # Add API routes
 api.add_resource(MedicationList, '/medications')
+api.add_resource(MedicationBatch, '/medications/batch')
 api.add_resource(MedicationDetail, '/medications/<string:medication_id>')
+api.add_resource(MedicationByName, '/medications/by-name/<string:name>')
+api.add_resource(InteractionCheck, '/interactions/check')
+api.add_resource(InteractionIndexStatus, '/interaction-index')
+api.add_resource(AliasIndexStatus, '/alias-index')
+api.add_resource(Imprints, '/imprints')
+api.add_resource(ImprintIndexStatus, '/imprint-index')
+api.add_resource(ReplicaStatus, '/replica')
+api.add_resource(Metrics, '/metrics')
+api.add_resource(Health, '/health')
+api.add_resource(SearchIndexStatus, '/search-index')
+api.add_resource(CacheStatus, '/cache')
+api.add_resource(CoalescingStatus, '/coalescing')
 
-def start_api(host='0.0.0.0', port=5000, debug=False):
+def start_api(host='0.0.0.0', port=5000, debug=False, search_engine=None, use_local_replica=False):
+    global SEARCH_ENGINE
+    if search_engine:
+        SEARCH_ENGINE = search_engine
+    if use_local_replica or os.getenv("MEDICATION_REPLICA") == "1":
+        enable_replica()
+    if SEARCH_ENGINE == 'index':
+        # Searches go to the database until the index has finished loading
+        search_index.warm_in_background()
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,519 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from . import api as sync_api
+from . import metrics
+from .api import (DB_QUERY_TIMEOUT, response_cache, error_response, use_replica, can_fall_back,
+                  record_write, record_delete, resolve_alias, with_alias_first, read_coalescer)
+from .retry import execute_async, breaker
+from .search_index import search_index
+from .interactions import interaction_index, parse_medications
+from .aliases import alias_index, name_or_id_filter
+from .imprints import imprint_index, normalize_code, DEFAULT_LIMIT as IMPRINT_LIMIT
+from .supabase_client import create_async_client
+from .pagination import (parse_fields, select_columns, project, decode_cursor, apply_page,
+                         clamp_limit, compute_etag, etag_matches, page_headers)
+from .batch import (parse_ids, parse_items, item_result, summarize, create_flow, update_flow, run_flow_async,
+                    INSERT, UPDATE)
+
+# Error body the Flask resources return when reqparse rejects a request
+BAD_REQUEST_ERROR = "400 Bad Request: The browser (or proxy) sent a request that this server could not understand."
+
+class BadRequest(Exception):
+    pass
+
+class TextBody(str):
+    """Response body sent as-is instead of being encoded as JSON"""
+
+    content_type = metrics.PROMETHEUS_CONTENT_TYPE
+
+class Request:
+    """The parts of an ASGI HTTP request the medication routes need"""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = {key: values[0] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+        self.headers = {key.decode().lower(): value.decode() for key, value in scope.get("headers", [])}
+        self.body = body
+        self.route = "unmatched"  # route pattern, set by dispatch for metrics labels
+
+    def arg_int(self, name: str, default: int) -> int:
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+    def body_json(self) -> Any:
+        """Parsed JSON body, or None when it is missing or invalid"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def json(self) -> Dict[str, Any]:
+        """Request fields from the JSON body, falling back to the query string like reqparse"""
+        fields = dict(self.args)
+        if self.body:
+            try:
+                data = json.loads(self.body)
+            except ValueError:
+                raise BadRequest()
+            if not isinstance(data, dict):
+                raise BadRequest()
+            fields.update(data)
+        return fields
+
+def _text(fields: Dict[str, Any], name: str) -> Optional[str]:
+    value = fields.get(name)
+    return None if value is None else str(value)
+
+def _flag(fields: Dict[str, Any], name: str) -> Optional[bool]:
+    value = fields.get(name)
+    return None if value is None else bool(value)
+
+class AsyncMedicationAPI:
+    """ASGI application serving the same routes and responses as the Flask API
+
+    All requests share one event loop and one async Supabase client, so many
+    requests can wait on the database at once without a thread each.
+    """
+
+    def __init__(self):
+        self.client = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        request = Request(scope, body)
+        started = time.perf_counter()
+        data, status, *extra = await self.dispatch(request)
+        metrics.record_request(request.route, request.method, status, time.perf_counter() - started)
+
+        content_type = "application/json"
+        if status == 304:
+            payload = b""
+        elif isinstance(data, TextBody):
+            payload, content_type = data.encode(), data.content_type
+        else:
+            payload = (json.dumps(data) + "\n").encode()
+        headers = [(b"content-type", content_type.encode()),
+                   (b"content-length", str(len(payload)).encode())]
+        for name, value in (extra[0] if extra else {}).items():
+            headers.append((name.lower().encode(), value.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        self.client = await create_async_client()
+        if sync_api.SEARCH_ENGINE == 'index' and not search_index.is_warm:
+            search_index.warm_in_background()
+        if sync_api.replica is not None:
+            sync_api.replica.start_background_sync()
+
+    async def shutdown(self):
+        if self.client is not None:
+            await self.client.postgrest.aclose()
+            self.client = None
+
+    async def dispatch(self, request: Request) -> Tuple:
+        """Route a request to its handler, returning (body, status) or (body, status, headers)"""
+        parts = [part for part in request.path.split("/") if part]
+        routes = {
+            ("medications",): {"GET": self.list_medications, "POST": self.create_medication},
+            ("medications", "batch"): {"GET": self.batch_get, "POST": self.batch_create, "PUT": self.batch_update},
+            ("interactions", "check"): {"GET": self.check_interactions, "POST": self.check_interactions},
+            ("interaction-index",): {"GET": self.interaction_index_status},
+            ("alias-index",): {"GET": self.alias_index_status},
+            ("imprints",): {"GET": self.imprints},
+            ("imprint-index",): {"GET": self.imprint_index_status},
+            ("replica",): {"GET": self.replica_status},
+            ("metrics",): {"GET": self.metrics_text},
+            ("health",): {"GET": self.health},
+            ("search-index",): {"GET": self.search_index_status},
+            ("cache",): {"GET": self.cache_status},
+            ("coalescing",): {"GET": self.coalescing_status},
+        }
+
+        args = ()
+        handlers = routes.get(tuple(parts))
+        if handlers is not None:
+            request.route = "/" + "/".join(parts)
+        elif len(parts) == 2 and parts[0] == "medications":
+            handlers = {"GET": self.get_medication, "PUT": self.update_medication,
+                        "DELETE": self.delete_medication}
+            args = (parts[1],)
+            # Same label as the Flask rule
+            request.route = "/medications/<string:medication_id>"
+        elif len(parts) == 3 and parts[:2] == ["medications", "by-name"]:
+            handlers = {"GET": self.get_medication_by_name}
+            args = (parts[2],)
+            request.route = "/medications/by-name/<string:name>"
+        if handlers is None:
+            return {"message": "The requested URL was not found on the server."}, 404
+        handler = handlers.get(request.method)
+        if handler is None:
+            return {"message": "The method is not allowed for the requested URL."}, 405
+
+        if self.client is None:
+            # Servers that skip the lifespan protocol
+            await self.startup()
+        try:
+            return await handler(request, *args)
+        except BadRequest:
+            return {"error": BAD_REQUEST_ERROR}, 500
+
+    def _medications(self):
+        return self.client.table("medications")
+
+    async def _read_rows(self, table: str, remote, local):
+        """Rows from the replica while it is fresh, otherwise from Supabase with the replica as fallback
+
+        Replica reads are SQLite queries, so they run on worker threads instead of the event loop.
+        """
+        if sync_api.replica is not None and await asyncio.to_thread(use_replica, table):
+            return await asyncio.to_thread(local)
+        try:
+            return (await execute_async(remote, deadline=DB_QUERY_TIMEOUT)).data
+        except Exception as e:
+            if sync_api.replica is not None and await asyncio.to_thread(can_fall_back, table, e):
+                return await asyncio.to_thread(local)
+            raise
+
+    async def _record_write(self, row):
+        """record_write(), on a worker thread when it also writes the replica"""
+        if sync_api.replica is not None:
+            await asyncio.to_thread(record_write, row)
+        else:
+            record_write(row)
+
+    async def _record_delete(self, medication_id):
+        """record_delete(), on a worker thread when it also writes the replica"""
+        if sync_api.replica is not None:
+            await asyncio.to_thread(record_delete, medication_id)
+        else:
+            record_delete(medication_id)
+
+    def _conditional(self, request: Request, data, headers):
+        if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+            return None, 304, headers
+        return data, 200, headers
+
+    async def list_medications(self, request: Request):
+        try:
+            query = request.args.get('query', '')
+            limit = clamp_limit(request.arg_int('limit', 10))
+            engine = request.args.get('engine', sync_api.SEARCH_ENGINE)
+
+            try:
+                fields = parse_fields(request.args.get('fields'))
+                after = decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            alias_id = resolve_alias(query)
+
+            if query and engine == 'index' and search_index.is_warm and after is None:
+                search_index.refresh_if_stale()
+                rows = with_alias_first(search_index.search(query, limit), alias_id, limit)
+                rows = [project(row, fields) for row in rows]
+                return self._conditional(request, rows, {"ETag": compute_etag(rows)})
+
+            cache_key = ("list", query, limit, select_columns(fields), after, alias_id)
+            rows = response_cache.get(cache_key)
+            if rows is None:
+                generation = response_cache.generation
+                builder = self._medications().select(select_columns(fields))
+                if alias_id is not None:
+                    builder = builder.or_(name_or_id_filter(query, alias_id))
+                elif query:
+                    builder = builder.ilike("name", f"%{query}%")
+
+                rows = await read_coalescer.do_async(cache_key, lambda: self._read_rows(
+                    "medications", apply_page(builder, after, limit).execute,
+                    lambda: [project(row, fields) for row in sync_api.replica.search("medications", query, limit, after)]))
+                response_cache.set(cache_key, rows, generation=generation)
+
+            return self._conditional(request, rows, page_headers(rows, limit, request.path, request.args))
+        except Exception as e:
+            return error_response(e)
+
+    async def create_medication(self, request: Request):
+        fields = request.json()
+        name = _text(fields, 'name')
+        if name is None:
+            raise BadRequest()
+        try:
+            prescription_only = _flag(fields, 'prescription_only')
+            drug_data = {
+                "name": name,
+                "slug": name.lower().replace(" ", "-"),
+                "generic_name": _text(fields, 'generic_name'),
+                "drug_class": _text(fields, 'drug_class'),
+                "description": _text(fields, 'description'),
+                "prescription_only": prescription_only
+            }
+
+            response = await execute_async(self._medications().insert(drug_data).execute,
+                                           deadline=DB_QUERY_TIMEOUT, idempotent=False)
+
+            if response.data and len(response.data) > 0:
+                await self._record_write(response.data[0])
+                return {"id": response.data[0]["id"], "message": f"Successfully added {name}"}, 201
+            else:
+                return {"error": f"Failed to add {name}"}, 400
+        except Exception as e:
+            return error_response(e)
+
+    async def get_medication(self, request: Request, medication_id: str):
+        try:
+            cache_key = ("detail", medication_id)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+            generation = response_cache.generation
+
+            builder = self._medications().select("*").eq("id", medication_id).limit(1)
+            rows = await read_coalescer.do_async(cache_key, lambda: self._read_rows(
+                "medications", builder.execute, lambda: sync_api.replica.get_many("medications", [medication_id])))
+
+            if rows and len(rows) > 0:
+                response_cache.set(cache_key, rows[0], generation=generation)
+                return rows[0], 200
+            else:
+                return {"error": "Medication not found"}, 404
+        except Exception as e:
+            return error_response(e)
+
+    async def get_medication_by_name(self, request: Request, name: str):
+        try:
+            if not alias_index.is_warm:
+                await asyncio.to_thread(alias_index.ensure_loaded)
+            alias_index.refresh_if_stale()
+            medication_id = alias_index.medication_id(name)
+        except Exception as e:
+            return error_response(e)
+
+        if medication_id is None:
+            return {"error": f"No medication found with the name '{name}'"}, 404
+        return await self.get_medication(request, medication_id)
+
+    async def delete_medication(self, request: Request, medication_id: str):
+        try:
+            builder = self._medications().delete().eq("id", medication_id)
+            response = await execute_async(builder.execute, deadline=DB_QUERY_TIMEOUT)
+
+            if response.data and len(response.data) > 0:
+                await self._record_delete(medication_id)
+                return {"message": "Medication deleted successfully"}, 200
+            else:
+                return {"error": "Failed to delete medication or medication not found"}, 404
+        except Exception as e:
+            return error_response(e)
+
+    async def update_medication(self, request: Request, medication_id: str):
+        fields = request.json()
+        try:
+            update_data = {}
+
+            name = _text(fields, 'name')
+            if name:
+                update_data["name"] = name
+                update_data["slug"] = name.lower().replace(" ", "-")
+
+            for field in ('generic_name', 'drug_class', 'description'):
+                value = _text(fields, field)
+                if value is not None:
+                    update_data[field] = value
+
+            prescription_only = _flag(fields, 'prescription_only')
+            if prescription_only is not None:
+                update_data["prescription_only"] = prescription_only
+
+            if not update_data:
+                return {"error": "No fields provided for update"}, 400
+
+            builder = self._medications().update(update_data).eq("id", medication_id)
+            response = await execute_async(builder.execute, deadline=DB_QUERY_TIMEOUT)
+
+            if response.data and len(response.data) > 0:
+                await self._record_write(response.data[0])
+                return {"message": "Medication updated successfully", "medication": response.data[0]}, 200
+            else:
+                return {"error": "Failed to update medication or medication not found"}, 404
+        except Exception as e:
+            return error_response(e)
+
+    async def batch_get(self, request: Request):
+        try:
+            try:
+                ids = parse_ids(request.args.get('ids', ''))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            # Serve what we can from the cache and fetch the rest with one in(...) query
+            results, missing = [], []
+            generation = response_cache.generation
+            for index, medication_id in enumerate(ids):
+                cached = response_cache.get(("detail", medication_id))
+                if cached is not None:
+                    results.append(item_result(index, 200, id=medication_id, medication=cached))
+                else:
+                    missing.append((index, medication_id))
+
+            if missing:
+                missing_ids = [medication_id for _, medication_id in missing]
+                builder = self._medications().select("*").in_("id", missing_ids)
+                rows = await self._read_rows("medications", builder.execute,
+                                             lambda: sync_api.replica.get_many("medications", missing_ids))
+                found = {str(row["id"]): row for row in rows or []}
+                for index, medication_id in missing:
+                    row = found.get(medication_id)
+                    if row is not None:
+                        response_cache.set(("detail", medication_id), row, generation=generation)
+                        results.append(item_result(index, 200, id=medication_id, medication=row))
+                    else:
+                        results.append(item_result(index, 404, id=medication_id, error="Medication not found"))
+
+            return summarize(results), 200
+        except Exception as e:
+            return error_response(e)
+
+    async def _perform_batch_operation(self, operation, payload):
+        """Run one operation of a batch flow against Supabase"""
+        if operation == INSERT:
+            return (await execute_async(self._medications().insert(payload).execute,
+                                        deadline=DB_QUERY_TIMEOUT, idempotent=False)).data
+        if operation == UPDATE:
+            update_data, ids = payload
+            return (await execute_async(self._medications().update(update_data).in_("id", ids).execute,
+                                        deadline=DB_QUERY_TIMEOUT)).data
+        await self._record_write(payload)
+
+    async def batch_create(self, request: Request):
+        try:
+            try:
+                items = parse_items(request.body_json())
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            return await run_flow_async(create_flow(items, error_response), self._perform_batch_operation), 200
+        except Exception as e:
+            return error_response(e)
+
+    async def batch_update(self, request: Request):
+        try:
+            try:
+                items = parse_items(request.body_json())
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            return await run_flow_async(update_flow(items, error_response), self._perform_batch_operation), 200
+        except Exception as e:
+            return error_response(e)
+
+    async def check_interactions(self, request: Request):
+        value = request.args.get('medications', '') if request.method == "GET" else request.body_json()
+        try:
+            medications = parse_medications(value)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        try:
+            if not interaction_index.is_warm:
+                # The first load pages through the catalog; keep it off the event loop
+                await asyncio.to_thread(interaction_index.ensure_loaded)
+            interaction_index.refresh_if_stale()
+            return interaction_index.check(medications), 200
+        except Exception as e:
+            return error_response(e)
+
+    async def interaction_index_status(self, request: Request):
+        return interaction_index.stats(), 200
+
+    async def alias_index_status(self, request: Request):
+        return alias_index.stats(), 200
+
+    async def imprints(self, request: Request):
+        code = request.args.get('code', '')
+        if not normalize_code(code):
+            return {"error": "Query parameter 'code' with at least one letter or digit is required"}, 400
+        limit = clamp_limit(request.arg_int('limit', IMPRINT_LIMIT))
+
+        try:
+            if not imprint_index.is_warm:
+                await asyncio.to_thread(imprint_index.ensure_loaded)
+            imprint_index.refresh_if_stale()
+            results = imprint_index.lookup(code, color=request.args.get('color'),
+                                           shape=request.args.get('shape'), limit=limit)
+            return {"code": code, "results": results, "count": len(results)}, 200
+        except Exception as e:
+            return error_response(e)
+
+    async def imprint_index_status(self, request: Request):
+        return imprint_index.stats(), 200
+
+    async def replica_status(self, request: Request):
+        if sync_api.replica is None:
+            return {"enabled": False}, 200
+        return {"enabled": True, **(await asyncio.to_thread(sync_api.replica.stats))}, 200
+
+    async def metrics_text(self, request: Request):
+        return TextBody(metrics.registry.render()), 200
+
+    async def health(self, request: Request):
+        state = breaker.stats()
+        status = 503 if state["state"] == breaker.OPEN else 200
+        return {"status": "ok" if status == 200 else "degraded", "circuit_breaker": state}, status
+
+    async def search_index_status(self, request: Request):
+        return search_index.stats(), 200
+
+    async def cache_status(self, request: Request):
+        return response_cache.stats(), 200
+
+    async def coalescing_status(self, request: Request):
+        return read_coalescer.stats(), 200
+
+asgi_app = AsyncMedicationAPI()
+
+def start_async_api(host='0.0.0.0', port=5000, debug=False, search_engine=None, use_local_replica=False):
+    """Serve the API with uvicorn on a single event loop"""
+    import uvicorn
+
+    if search_engine:
+        sync_api.SEARCH_ENGINE = search_engine
+    if use_local_replica or os.getenv("MEDICATION_REPLICA") == "1":
+        # Synced from startup(), once the server is running
+        sync_api.enable_replica(start_sync=False)
+    uvicorn.run(asgi_app, host=host, port=port, log_level="debug" if debug else "info")
@@ -0,0 +1,232 @@
+import json
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Generator, List, Optional, Tuple
+
+from .retry import is_rejection
+
+# Most items accepted by a single batch request
+MAX_BATCH_ITEMS = 100
+
+# Operations a batch flow yields to the server running it: INSERT with a list of rows,
+# UPDATE with (changes, ids) and WRITTEN with a row that was just created or updated
+INSERT, UPDATE, WRITTEN = "insert", "update", "written"
+
+# Batch flows: generators yielding (operation, payload) pairs and returning the response body
+BatchFlow = Generator[Tuple[str, Any], Any, Dict[str, Any]]
+
+UPDATABLE_TEXT_FIELDS = ('generic_name', 'drug_class', 'description')
+
+def parse_ids(value: Any) -> List[str]:
+    """Medication IDs from ?ids=a,b,c (or a JSON list), de-duplicated in order"""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ValueError("ids must be a comma-separated list")
+    ids = []
+    for item in value:
+        item = str(item).strip()
+        if item and item not in ids:
+            ids.append(item)
+    if not ids:
+        raise ValueError("No ids provided")
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} ids per request")
+    return ids
+
+def parse_items(body: Any) -> List[Any]:
+    """Items of a batch write body: a JSON list or {"medications": [...]}"""
+    if isinstance(body, dict):
+        body = body.get("medications")
+    if not isinstance(body, list) or not body:
+        raise ValueError("Expected a non-empty list of medications")
+    if len(body) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} medications per request")
+    return body
+
+def build_create(item: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Row to insert for one batch item (same rules as POST /medications), or an error"""
+    if not isinstance(item, dict):
+        return None, "Medication must be a JSON object"
+    name = item.get('name')
+    if not name:
+        return None, "Name is required"
+    name = str(name)
+    prescription_only = item.get('prescription_only')
+    return {
+        "name": name,
+        "slug": name.lower().replace(" ", "-"),
+        "generic_name": item.get('generic_name'),
+        "drug_class": item.get('drug_class'),
+        "description": item.get('description'),
+        "prescription_only": None if prescription_only is None else bool(prescription_only)
+    }, None
+
+def build_update(item: Any) -> Tuple[Optional[str], Optional[Dict[str, Any]], Optional[str]]:
+    """(id, changes) for one batch item (same rules as PUT /medications/<id>), or an error"""
+    if not isinstance(item, dict):
+        return None, None, "Medication must be a JSON object"
+    medication_id = item.get('id')
+    if medication_id is None or medication_id == "":
+        return None, None, "id is required"
+    medication_id = str(medication_id)
+
+    update_data = {}
+    if item.get('name'):
+        update_data["name"] = str(item['name'])
+        update_data["slug"] = update_data["name"].lower().replace(" ", "-")
+    for field in UPDATABLE_TEXT_FIELDS:
+        if item.get(field) is not None:
+            update_data[field] = item[field]
+    if item.get('prescription_only') is not None:
+        update_data["prescription_only"] = bool(item['prescription_only'])
+
+    if not update_data:
+        return medication_id, None, "No fields provided for update"
+    return medication_id, update_data, None
+
+def group_updates(updates: List[Tuple[int, str, Dict[str, Any]]]) -> List[Tuple[Dict[str, Any], List[Tuple[int, str]]]]:
+    """Group (index, id, changes) items that apply identical changes so each group is one UPDATE ... IN (...)"""
+    groups: Dict[str, Tuple[Dict[str, Any], List[Tuple[int, str]]]] = {}
+    for index, medication_id, update_data in updates:
+        key = json.dumps(update_data, sort_keys=True, default=str)
+        groups.setdefault(key, (update_data, []))[1].append((index, medication_id))
+    return list(groups.values())
+
+# Error of an item whose insert returned no row (e.g. hidden by row-level security)
+NOT_RETURNED = "The database did not return the created medication"
+
+def match_created(rows: List[Tuple[int, Dict[str, Any]]], created: List[Dict[str, Any]]):
+    """Pair inserted (index, row) items with the rows the insert returned
+
+    Rows are matched on name and slug rather than position, so a response
+    missing some rows cannot shift the rest onto the wrong items. Returns the
+    matched ((index, row), created_row) pairs and the items left unmatched.
+    """
+    pending: Dict[Tuple[Any, Any], List[Tuple[int, Dict[str, Any]]]] = {}
+    for index, row in rows:
+        pending.setdefault((row["name"], row["slug"]), []).append((index, row))
+    matched = []
+    for created_row in created:
+        items = pending.get((created_row.get("name"), created_row.get("slug")))
+        if items:
+            matched.append((items.pop(0), created_row))
+    unmatched = sorted(item for items in pending.values() for item in items)
+    return matched, unmatched
+
+def item_result(index: int, status: int, **fields) -> Dict[str, Any]:
+    return {"index": index, "status": status, **fields}
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Batch response body: per-item results plus success/failure counts"""
+    results = sorted(results, key=lambda result: result["index"])
+    succeeded = sum(1 for result in results if result["status"] < 400)
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+def create_flow(items: List[Any], describe_error: Callable[[Exception], Tuple[Dict[str, Any], int]]) -> BatchFlow:
+    """Batch create: one multi-row insert for every valid item
+
+    When the insert is rejected the items are inserted one by one to find out
+    which of them were; any other failure is raised. describe_error maps an
+    item's exception to its (body, status). An item whose row the database did
+    not return fails with a 500 instead of being left out of the results.
+    """
+    results, rows = [], []
+    for index, item in enumerate(items):
+        row, error = build_create(item)
+        if error:
+            results.append(item_result(index, 400, error=error))
+        else:
+            rows.append((index, row))
+
+    if rows:
+        try:
+            created, unmatched = match_created(rows, (yield INSERT, [row for _, row in rows]) or [])
+        except Exception as e:
+            if not is_rejection(e):
+                raise
+            created, unmatched = [], []
+            for index, row in rows:
+                try:
+                    returned = (yield INSERT, [row]) or []
+                except Exception as e:
+                    body, status = describe_error(e)
+                    results.append(item_result(index, status, **body))
+                    continue
+                if returned:
+                    created.append(((index, row), returned[0]))
+                else:
+                    unmatched.append((index, row))
+
+        results.extend(item_result(index, 500, error=NOT_RETURNED) for index, _ in unmatched)
+
+        for (index, row), created_row in created:
+            yield WRITTEN, created_row
+            results.append(item_result(index, 201, id=created_row["id"], message=f"Successfully added {row['name']}"))
+
+    return summarize(results)
+
+def update_flow(items: List[Any], describe_error: Callable[[Exception], Tuple[Dict[str, Any], int]]) -> BatchFlow:
+    """Batch update: items applying identical changes share one UPDATE ... WHERE id IN (...)
+
+    An id may appear only once per batch, since the order in which two updates
+    of one medication would apply is undefined; every item naming it is rejected.
+    """
+    results, updates = [], []
+    for index, item in enumerate(items):
+        medication_id, update_data, error = build_update(item)
+        if error:
+            results.append(item_result(index, 400, id=medication_id, error=error))
+        else:
+            updates.append((index, medication_id, update_data))
+
+    occurrences = Counter(medication_id for _, medication_id, _ in updates)
+    for index, medication_id, _ in updates:
+        if occurrences[medication_id] > 1:
+            results.append(item_result(index, 400, id=medication_id, error="id appears more than once in this batch"))
+    updates = [update for update in updates if occurrences[update[1]] == 1]
+
+    for update_data, targets in group_updates(updates):
+        try:
+            rows = yield UPDATE, (update_data, [medication_id for _, medication_id in targets])
+        except Exception as e:
+            body, status = describe_error(e)
+            results.extend(item_result(index, status, id=medication_id, **body) for index, medication_id in targets)
+            continue
+
+        updated = {str(row["id"]): row for row in rows or []}
+        for index, medication_id in targets:
+            row = updated.get(medication_id)
+            if row is None:
+                results.append(item_result(index, 404, id=medication_id,
+                                           error="Failed to update medication or medication not found"))
+                continue
+            yield WRITTEN, row
+            results.append(item_result(index, 200, id=medication_id, medication=row))
+
+    return summarize(results)
+
+def run_flow(flow: BatchFlow, perform: Callable[[str, Any], Any]) -> Dict[str, Any]:
+    """Drive a batch flow, sending it what perform(operation, payload) returns or raises"""
+    result, error = None, None
+    while True:
+        try:
+            operation = flow.throw(error) if error is not None else flow.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = perform(*operation), None
+        except Exception as e:
+            result, error = None, e
+
+async def run_flow_async(flow: BatchFlow, perform: Callable[[str, Any], Awaitable[Any]]) -> Dict[str, Any]:
+    """run_flow() for servers whose operations are coroutines"""
+    result, error = None, None
+    while True:
+        try:
+            operation = flow.throw(error) if error is not None else flow.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = await perform(*operation), None
+        except Exception as e:
+            result, error = None, e
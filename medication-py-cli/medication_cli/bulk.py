@@ -0,0 +1,180 @@
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .streaming import iter_json_records
+
+# File extensions picked up when a directory is given as the import source
+IMPORT_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+# How often the live progress readout is refreshed
+PROGRESS_INTERVAL = 0.5  # seconds
+
+class BulkImportStats:
+    """Thread-safe counters for a bulk import run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.drugs = 0
+        self.rows = 0
+        self.failed = 0
+        self.unchanged = 0
+        self.updated = 0
+        self.failures: List[Tuple[str, str]] = []
+
+    def record_success(self, rows: int):
+        with self._lock:
+            self.drugs += 1
+            self.rows += rows
+
+    def record_upsert(self, result: Dict[str, Any]):
+        """Count one upserted drug; rows are the drug and child rows actually written"""
+        from .upsert import UNCHANGED, UPDATED
+
+        with self._lock:
+            self.drugs += 1
+            if result["status"] == UNCHANGED:
+                self.unchanged += 1
+                return
+            self.updated += result["status"] == UPDATED
+            self.rows += 1 + result["inserted"] + result["deleted"]
+
+    def record_partial(self, label: str, rows: int, reason: str):
+        """Count a drug that was written with some of its child rows missing as imported and failed"""
+        with self._lock:
+            self.drugs += 1
+            self.rows += rows
+            self.failed += 1
+            self.failures.append((label, reason))
+
+    def record_failure(self, label: str, reason: str):
+        with self._lock:
+            self.failed += 1
+            self.failures.append((label, reason))
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.time() - self.started, 1e-9)
+
+    def progress_line(self) -> str:
+        elapsed = self.elapsed
+        unchanged = f", {self.unchanged} unchanged" if self.unchanged else ""
+        return (f"{self.drugs} drugs{unchanged}, {self.rows} rows, {self.failed} failed "
+                f"| {self.drugs / elapsed:.1f} drugs/s, {self.rows / elapsed:.1f} rows/s "
+                f"| {elapsed:.1f}s")
+
+def resolve_sources(source: str) -> List[str]:
+    """Expand a file, directory or glob pattern into a sorted list of import files"""
+    if os.path.isfile(source):
+        return [source]
+
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            for name in names:
+                if name.lower().endswith(IMPORT_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+        return sorted(files)
+
+    return sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+
+def iter_records(path: str) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield (label, drug_data, error) for every drug record in an import file
+
+    NDJSON files yield one record per line; JSON files may hold a single drug object
+    or an array of them, which is streamed element by element. Records that cannot
+    be parsed are yielded with an error instead of aborting the whole run.
+    """
+    try:
+        for record in iter_json_records(path):
+            yield f"{path}[{record.index}]", record.data, record.error
+    except OSError as e:
+        yield path, None, str(e)
+
+def _with_warnings(reason: str, warnings: List[str]) -> str:
+    if not warnings:
+        return reason
+    more = f" (+{len(warnings) - 1} more)" if len(warnings) > 1 else ""
+    return f"{reason}: {warnings[0]}{more}"
+
+def run_bulk_import(sources: List[str], workers: int = 4, batch_size: Optional[int] = None,
+                    on_progress: Optional[Callable[[BulkImportStats], None]] = None,
+                    upsert: bool = False) -> BulkImportStats:
+    """Import every drug record in sources using a bounded pool of worker threads
+
+    At most twice as many records as there are workers are held in memory at once,
+    so very large catalogs are read lazily while the pool drains them. A failing
+    record is recorded in the returned stats and never stops the run. With upsert,
+    drugs are matched on slug and only what changed is written.
+    """
+    from .cli import DEFAULT_BATCH_SIZE, insert_drug
+    from .export import import_format_to_rows
+
+    if batch_size is None:
+        batch_size = DEFAULT_BATCH_SIZE
+    workers = max(1, workers)
+    stats = BulkImportStats()
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    done = threading.Event()
+
+    upserter = None
+    if upsert:
+        from .upsert import DrugUpserter
+        upserter = DrugUpserter(batch_size=batch_size)
+        upserter.preload()
+
+    def import_one(label: str, drug_data: Dict[str, Any]):
+        # Rejected rows are reported with the record instead of printed over the progress line
+        warnings: List[str] = []
+        try:
+            if not isinstance(drug_data, dict):
+                raise ValueError("Drug record must be a JSON object")
+            if upserter is not None:
+                stats.record_upsert(upserter.upsert(drug_data, warn=warnings.append))
+                return
+
+            base_fields, children = import_format_to_rows(drug_data)
+            drug, written = insert_drug(base_fields, children, batch_size, warn=warnings.append)
+            if drug is None:
+                raise RuntimeError("Failed to insert drug")
+            missing = sum(len(rows) for rows in children.values()) - sum(written.values())
+            if missing:
+                stats.record_partial(label, 1 + sum(written.values()),
+                                     _with_warnings(f"Drug {drug['id']}: {missing} child rows not written", warnings))
+            else:
+                stats.record_success(1 + sum(written.values()))
+        except Exception as e:
+            stats.record_failure(label, _with_warnings(str(e), warnings))
+        finally:
+            in_flight.release()
+
+    def report():
+        while not done.wait(PROGRESS_INTERVAL):
+            on_progress(stats)
+
+    reporter = None
+    if on_progress:
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path in sources:
+                for label, drug_data, error in iter_records(path):
+                    if error:
+                        stats.record_failure(label, error)
+                        continue
+                    in_flight.acquire()
+                    executor.submit(import_one, label, drug_data)
+    finally:
+        done.set()
+        if reporter:
+            reporter.join()
+
+    if on_progress:
+        on_progress(stats)
+    return stats
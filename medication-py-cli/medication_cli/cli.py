@@ -1,31 +1,159 @@
 import click
 import json
+import os
 import sys
 from .supabase_client import supabase
-from typing import Dict, List, Optional, Any
+from .retry import execute, is_rejection
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+# Maximum number of child rows sent in a single multi-row insert
+DEFAULT_BATCH_SIZE = 500
 
 @click.group()
-def cli():
+@click.option('--timings', is_flag=True, help='Print a per-table summary of Supabase calls when the command finishes')
+@click.pass_context
+def cli(ctx, timings):
     """Medication Database CLI Tool"""
-    pass
+    if timings:
+        ctx.call_on_close(print_timings)
+
+def print_timings():
+    """Per table/operation count and latency of the Supabase calls made by this command"""
+    from .metrics import summary
+    
+    rows = summary()
+    if not rows:
+        click.echo("No Supabase calls were made.", err=True)
+        return
+    click.echo(f"\n{'table':<26} {'operation':<10} {'calls':>6} {'total ms':>10} {'avg ms':>8} {'retries':>8} {'errors':>7}", err=True)
+    for row in rows:
+        click.echo(f"{row['table']:<26} {row['operation']:<10} {row['calls']:>6} {row['total_ms']:>10.1f} "
+                   f"{row['avg_ms']:>8.1f} {row['retries']:>8.0f} {row['errors']:>7.0f}", err=True)
+
+def file_identity(path: str) -> Dict[str, Any]:
+    """Absolute path, size and modification time a checkpoint records for the file it belongs to"""
+    info = os.stat(path)
+    return {"file": os.path.abspath(path), "size": info.st_size, "mtime": info.st_mtime}
+
+def checkpoint_mismatch(saved: Dict[str, Any], path: str) -> Optional[str]:
+    """Why a saved checkpoint cannot resume an import of path, or None when it can"""
+    current = file_identity(path)
+    if os.path.abspath(saved.get("file") or "") != current["file"]:
+        return f"it belongs to {saved.get('file')}"
+    # Checkpoints written before size and mtime were recorded are matched on the path alone
+    if any(key in saved and saved[key] != current[key] for key in ("size", "mtime")):
+        return f"{path} has changed since it was written"
+    return None
 
 @cli.command('import')
 @click.argument('file', type=click.Path(exists=True))
-def import_drug(file):
-    """Import drug data from a JSON file"""
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Maximum number of child rows sent per insert request')
+@click.option('--start-offset', default=0, help='Resume from this byte offset in the file')
+@click.option('--start-index', default=0, help='Resume from this record index in the file')
+@click.option('--checkpoint', type=click.Path(), help='File used to record progress and resume after a crash')
+@click.option('--upsert', is_flag=True, help='Match drugs on slug and write only what changed since the last import')
+def import_drug(file, batch_size, start_offset, start_index, checkpoint, upsert):
+    """Import drug data from a JSON, JSON array or NDJSON file"""
+    from .streaming import iter_json_records
+    
     try:
-        with open(file, 'r') as f:
-            drug_data = json.load(f)
+        upserter = None
+        if upsert:
+            from .upsert import DrugUpserter, UNCHANGED
+            upserter = DrugUpserter(batch_size=batch_size)
+            upserter.preload()
         
-        result = import_drug_with_relationships(drug_data)
-        if result:
-            click.echo(f"Successfully imported {drug_data.get('name')} with ID: {result}")
-        else:
-            click.echo(f"Failed to import {drug_data.get('name')}")
+        # Pick up where a previous run left off, but only in the very file it was reading
+        if checkpoint and os.path.exists(checkpoint) and not (start_offset or start_index):
+            with open(checkpoint, 'r') as f:
+                saved = json.load(f)
+            mismatch = checkpoint_mismatch(saved, file)
+            if mismatch:
+                click.echo(f"Error: Cannot resume from checkpoint {checkpoint}: {mismatch}. "
+                           "Remove it to import from the start.", err=True)
+                sys.exit(1)
+            start_offset, start_index = saved.get("offset", 0), saved.get("index", 0)
+            click.echo(f"Resuming {file} from record {start_index} (byte offset {start_offset})")
+        identity = file_identity(file) if checkpoint else None
+        
+        # Records are parsed one at a time, so large dumps never sit in memory whole
+        for record in iter_json_records(file, start_offset=start_offset, start_index=start_index):
+            if record.error:
+                click.echo(f"Error in record {record.index}: {record.error}", err=True)
+                sys.exit(1)
+            
+            drug_data = record.data
+            failed = False
+            if not isinstance(drug_data, dict):
+                click.echo(f"Skipping record {record.index}: not a JSON object", err=True)
+            elif upserter is not None:
+                try:
+                    result = upserter.upsert(drug_data)
+                except Exception as e:
+                    click.echo(f"Failed to import {drug_data.get('name')}: {e}")
+                    failed = True
+                else:
+                    if result["status"] == UNCHANGED:
+                        click.echo(f"Unchanged {drug_data.get('name')} (ID: {result['id']})")
+                    else:
+                        click.echo(f"{result['status'].capitalize()} {drug_data.get('name')} with ID: {result['id']} "
+                                   f"({result['inserted']} child rows inserted, {result['deleted']} deleted)")
+            else:
+                result = import_drug_with_relationships(drug_data, batch_size=batch_size)
+                if result:
+                    click.echo(f"Successfully imported {drug_data.get('name')} with ID: {result}")
+                else:
+                    click.echo(f"Failed to import {drug_data.get('name')}")
+                    failed = True
+            
+            if checkpoint:
+                if failed:
+                    # Stop before the checkpoint passes the record, so resuming retries it
+                    click.echo(f"Stopped at record {record.index}; re-run to retry it from the checkpoint", err=True)
+                    sys.exit(1)
+                with open(checkpoint, 'w') as f:
+                    json.dump({**identity, "offset": record.offset, "index": record.index + 1}, f)
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
+@cli.command('bulk-import')
+@click.argument('source')
+@click.option('--workers', default=4, show_default=True, help='Number of drugs imported concurrently')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Maximum number of child rows sent per insert request')
+@click.option('--upsert', is_flag=True, help='Match drugs on slug and write only what changed since the last import')
+def bulk_import(source, workers, batch_size, upsert):
+    """Import drugs from a directory, glob pattern or NDJSON file"""
+    from .bulk import resolve_sources, run_bulk_import
+    
+    sources = resolve_sources(source)
+    if not sources:
+        click.echo(f"Error: No import files found for '{source}'", err=True)
+        sys.exit(1)
+    
+    click.echo(f"Importing from {len(sources)} file(s) with {workers} worker(s)")
+    
+    def show_progress(stats):
+        click.echo(f"\r{stats.progress_line()}", nl=False, err=True)
+    
+    try:
+        stats = run_bulk_import(sources, workers=workers, batch_size=batch_size, on_progress=show_progress,
+                                upsert=upsert)
+    except Exception as e:
+        click.echo(f"\nError: {e}", err=True)
+        sys.exit(1)
+    
+    click.echo("", err=True)
+    unchanged = f", {stats.unchanged} unchanged" if upsert else ""
+    click.echo(f"Imported {stats.drugs} drugs ({stats.rows} rows{unchanged}) in {stats.elapsed:.1f}s, {stats.failed} failed")
+    if stats.failures:
+        click.echo("Failed records:")
+        for label, reason in stats.failures:
+            click.echo(f"- {label}: {reason}")
+        sys.exit(1)
+
 @cli.command('add_drug')
 @click.argument('name')
 @click.option('--generic', help='Generic name of the drug')
@@ -46,7 +174,7 @@ def add_drug(name, generic, drug_class, description, otc):
         }
         
         # Insert into medications table
-        response = supabase.table("medications").insert(drug_data).execute()
+        response = execute(supabase.table("medications").insert(drug_data).execute, idempotent=False)
         
         if response.data and len(response.data) > 0:
             drug_id = response.data[0]["id"]
@@ -57,17 +185,84 @@ def add_drug(name, generic, drug_class, description, otc):
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
+def open_replica():
+    """Local read replica, synced first if it is past its staleness bound
+    
+    When the sync fails (e.g. Supabase is down) the stale copy is used with a warning.
+    """
+    from .replica import Replica
+    
+    replica = Replica()
+    if not replica.is_fresh("medications"):
+        try:
+            replica.sync()
+        except Exception as e:
+            if not replica.has_data("medications"):
+                raise
+            click.echo(f"Warning: Could not sync replica, using data from {replica.age('medications'):.0f}s ago: {e}", err=True)
+    return replica
+
+def find_medication(name):
+    """Medication row for a name, resolving brand, generic and international names
+    
+    An exact name match is one query, so it is tried first; otherwise the name is
+    looked up in the alias index.
+    """
+    rows = execute(supabase.table("medications").select("*").ilike("name", name).limit(1).execute).data
+    if rows:
+        return rows[0]
+    
+    from .aliases import alias_index
+    alias_index.load()
+    medication_id = alias_index.medication_id(name)
+    if medication_id is None:
+        return None
+    rows = execute(supabase.table("medications").select("*").eq("id", medication_id).limit(1).execute).data
+    return rows[0] if rows else None
+
+@cli.command('sync-replica')
+@click.option('--full', is_flag=True, help='Replace the replica with a fresh copy of every table')
+def sync_replica(full):
+    """Sync the local read replica with Supabase"""
+    from .replica import Replica
+    
+    try:
+        replica = Replica()
+        results = replica.sync(full=full, reconcile=full)
+        for table, counts in results.items():
+            click.echo(f"{table}: {counts['synced']} synced, {counts['removed']} removed")
+        stats = replica.stats()
+        click.echo(f"Replica at {stats['path']} holds "
+                   + ", ".join(f"{info['rows']} {table}" for table, info in stats["tables"].items()))
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
 @cli.command('search')
 @click.argument('query')
 @click.option('--limit', default=10, help='Maximum number of results to return')
-def search_medications(query, limit):
+@click.option('--local', is_flag=True, help='Rank matches with an in-process search index (typo tolerant; reads the whole table)')
+@click.option('--replica', 'from_replica', is_flag=True, help='Read from the local replica instead of Supabase')
+def search_medications(query, limit, local, from_replica):
     """Search medications by name"""
     try:
-        response = supabase.table("medications").select("*").ilike("name", f"%{query}%").limit(limit).execute()
+        if local:
+            from .search_index import search_index
+            search_index.load()
+            results = search_index.search(query, limit)
+        elif from_replica:
+            results = open_replica().search("medications", query, limit)
+        else:
+            results = execute(supabase.table("medications").select("*").ilike("name", f"%{query}%").limit(limit).execute).data
         
-        if response.data:
-            click.echo(f"Found {len(response.data)} medications:")
-            for med in response.data:
+        if not results and not from_replica:
+            # "Paracetamol" finds Acetaminophen through its international name
+            med = find_medication(query)
+            results = [med] if med else []
+        
+        if results:
+            click.echo(f"Found {len(results)} medications:")
+            for med in results:
                 click.echo(f"- {med['name']}")
         else:
             click.echo("No medications found matching your query.")
@@ -77,13 +272,18 @@ def search_medications(query, limit):
 
 @cli.command('get')
 @click.argument('name')
-def get_medication(name):
+@click.option('--replica', 'from_replica', is_flag=True, help='Read from the local replica instead of Supabase')
+def get_medication(name, from_replica):
     """Get detailed information about a medication"""
     try:
-        response = supabase.table("medications").select("*").ilike("name", name).limit(1).execute()
+        if from_replica:
+            med = open_replica().find_by_name("medications", name)
+        else:
+            med = find_medication(name)
+        rows = [med] if med else []
         
-        if response.data and len(response.data) > 0:
-            med = response.data[0]
+        if rows and len(rows) > 0:
+            med = rows[0]
             click.echo(f"\n{med['name']} Details:")
             click.echo(f"Generic Name: {med.get('generic_name', 'N/A')}")
             click.echo(f"Drug Class: {med.get('drug_class', 'N/A')}")
@@ -95,25 +295,100 @@ def get_medication(name):
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
+@cli.command('check-interactions')
+@click.argument('medications', nargs=-1, required=True)
+def check_interactions(medications):
+    """Check a medication list for drug-drug interactions, most severe first"""
+    from .interactions import interaction_index, parse_medications, SEVERITY_LEVELS
+    
+    try:
+        medications = parse_medications(list(medications))
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    try:
+        interaction_index.load()
+        result = interaction_index.check(medications)
+        
+        unknown = [med["input"] for med in result["medications"] if not med["matched"]]
+        if unknown:
+            click.echo(f"Not in the drug catalog: {', '.join(unknown)}")
+        
+        if not result["count"]:
+            click.echo("No interactions found.")
+            return
+        
+        click.echo(f"Found {result['count']} interactions:")
+        for level in SEVERITY_LEVELS:
+            items = result["interactions"][level]
+            if items:
+                click.echo(f"\n{level.capitalize()}:")
+                for item in items:
+                    click.echo(f"- {item['medications'][0]} + {item['medications'][1]} ({item['source']}: {item['interaction']})")
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command('identify')
+@click.argument('code')
+@click.option('--color', help='Only pills whose imprint description mentions this color')
+@click.option('--shape', help='Only pills whose imprint description mentions this shape')
+@click.option('--limit', '-l', default=10, help='Maximum number of candidate drugs to show')
+def identify(code, color, shape, limit):
+    """Identify a pill from its (partial) imprint code, best matches first"""
+    from .imprints import imprint_index, normalize_code
+    
+    if not normalize_code(code):
+        click.echo("Error: The imprint code needs at least one letter or digit", err=True)
+        sys.exit(1)
+    
+    try:
+        imprint_index.load()
+        results = imprint_index.lookup(code, color=color, shape=shape, limit=limit)
+        
+        if not results:
+            click.echo(f"No pills found matching imprint '{code}'.")
+            return
+        
+        click.echo(f"Found {len(results)} candidate drugs for imprint '{code}':")
+        for result in results:
+            generic = f" ({result['generic']})" if result.get('generic') else ""
+            click.echo(f"\n{result['name']}{generic} [{result['match']} match]")
+            for imprint in result["imprints"]:
+                description = f": {imprint['description']}" if imprint.get('description') else ""
+                click.echo(f"- {imprint['imprint_code']}{description}")
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
 @cli.command('export')
-@click.argument('name')
+@click.argument('name', required=False)
 @click.option('--output', '-o', type=click.Path(), help='Output file path (defaults to medication-name.json)')
-def export_medication(name, output):
-    """Export medication data to a JSON file"""
+@click.option('--all', 'export_all', is_flag=True, help='Stream the whole drug catalog as NDJSON')
+@click.option('--filter', 'name_filter', help='Stream every drug whose name contains this text as NDJSON')
+@click.option('--page-size', default=500, show_default=True, help='Drugs fetched per request in bulk mode')
+def export_medication(name, output, export_all, name_filter, page_size):
+    """Export medication data to a JSON file, or the drug catalog to NDJSON"""
+    if export_all or name_filter:
+        export_catalog_ndjson(output, name_filter, page_size)
+        return
+    if not name:
+        click.echo("Error: Provide a medication name, --all or --filter", err=True)
+        sys.exit(1)
+    
     try:
-        # Get medication data
-        response = supabase.table("medications").select("*").ilike("name", name).limit(1).execute()
+        # Get medication data (brand, generic and international names resolve too)
+        medication = find_medication(name)
         
-        if not response.data or len(response.data) == 0:
+        if not medication:
             click.echo(f"No medication found with the name '{name}'.")
             return
-            
-        medication = response.data[0]
         
         # Convert to the format expected by the import function
         export_data = {
             "name": medication.get("name"),
-            "slug": name.lower().replace(" ", "-"),
+            "slug": (medication.get("name") or name).lower().replace(" ", "-"),
             "consumer_info": medication.get("description"),
             "side_effects": medication.get("side_effects"),
             "dosage": medication.get("dosage"),
@@ -147,128 +422,177 @@ def export_medication(name, output):
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
+def export_catalog_ndjson(output, name_filter, page_size):
+    """Stream drugs with their child tables to an NDJSON file (or stdout for '-')"""
+    from .export import export_catalog
+    
+    try:
+        if not output or output == '-':
+            count = export_catalog(sys.stdout, page_size=page_size, name_filter=name_filter)
+        else:
+            with open(output, 'w') as f:
+                count = export_catalog(f, page_size=page_size, name_filter=name_filter)
+        click.echo(f"Exported {count} drugs to {output or 'stdout'}", err=True)
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
 @cli.command('api')
 @click.option('--host', default='0.0.0.0', help='Host to run the API server on')
 @click.option('--port', default=5000, help='Port to run the API server on')
 @click.option('--debug', is_flag=True, help='Run in debug mode')
-def start_api_server(host, port, debug):
-    """Start the Flask API server"""
+@click.option('--search-engine', type=click.Choice(['db', 'index']), default=None,
+              help='Serve ?query= searches from the database or the in-process search index')
+@click.option('--mode', type=click.Choice(['dev', 'async', 'production']), default='dev', show_default=True,
+              help='dev: Flask development server; async: ASGI app on uvicorn with an async Supabase client; '
+                   'production: pre-forked gunicorn workers')
+@click.option('--workers', type=int, help='[production] Worker processes (defaults to one per CPU core)')
+@click.option('--threads', default=4, show_default=True, help='[production] Threads per worker process')
+@click.option('--timeout', default=30, show_default=True, help='[production] Seconds before a stuck worker is restarted')
+@click.option('--keep-alive', default=5, show_default=True, help='[production] Seconds to hold idle keep-alive connections')
+@click.option('--graceful-timeout', default=30, show_default=True,
+              help='[production] Seconds workers get to finish requests on restart (SIGHUP) or shutdown')
+@click.option('--replica', 'use_local_replica', is_flag=True,
+              help='Serve reads from a local SQLite replica synced in the background')
+def start_api_server(host, port, debug, search_engine, mode, workers, threads, timeout, keep_alive, graceful_timeout,
+                     use_local_replica):
+    """Start the API server"""
     try:
-        from .api import start_api
+        options = {"use_local_replica": use_local_replica}
+        if mode == 'async':
+            from .asgi import start_async_api as start_api
+        elif mode == 'production':
+            from .server import start_production_api as start_api
+            options.update({"workers": workers, "threads": threads, "timeout": timeout,
+                            "keep_alive": keep_alive, "graceful_timeout": graceful_timeout})
+        else:
+            from .api import start_api
         click.echo(f"Starting API server on http://{host}:{port}")
-        start_api(host=host, port=port, debug=debug)
-    except ImportError as e:
-        click.echo("Error: Flask or Flask-RESTful not installed. Install with 'pip install flask flask-restful'")
+        start_api(host=host, port=port, debug=debug, search_engine=search_engine, **options)
+    except ImportError:
+        if mode == 'async':
+            click.echo("Error: uvicorn not installed. Install with 'pip install uvicorn'")
+        elif mode == 'production':
+            click.echo("Error: gunicorn not installed. Install with 'pip install gunicorn'")
+        else:
+            click.echo("Error: Flask or Flask-RESTful not installed. Install with 'pip install flask flask-restful'")
         sys.exit(1)
     except Exception as e:
         click.echo(f"Error starting API server: {e}", err=True)
         sys.exit(1)
 
-def import_drug_with_relationships(drug_data: Dict[str, Any]) -> Optional[str]:
-    """Import a drug and its relationships into the Supabase database"""
-    try:
-        # 1. Insert core drug data
-        base_fields = {
-            "name": drug_data.get("name"),
-            "slug": drug_data.get("slug"),
-            "consumer_info": drug_data.get("consumer_info"),
-            "side_effects": drug_data.get("side_effects"),
-            "dosage": drug_data.get("dosage"),
-            "pregnancy": drug_data.get("pregnancy"),
-            "breastfeeding": drug_data.get("breastfeeding"),
-            "classification": drug_data.get("classification"),
-            "drug_class": drug_data.get("drug_class"),
-            "generic": drug_data.get("generic"),
-            "otc": drug_data.get("otc")
-        }
-        
-        response = supabase.table("drugs").insert(base_fields).execute()
-        
-        if not response.data or len(response.data) == 0:
-            print('Failed to insert drug')
-            return None
-        
-        drug_id = response.data[0]["id"]
-        print(f"Successfully inserted drug with ID: {drug_id}")
-        
-        # 2. Insert interactions if they exist
-        interactions = drug_data.get("interactions", {})
-        
-        interaction_levels = ["major", "moderate", "minor", "unknown"]
-        for level in interaction_levels:
-            level_interactions = interactions.get(level, [])
-            
-            for interaction in level_interactions:
-                try:
-                    supabase.table("drug_interactions").insert({
-                        "drug_id": drug_id,
-                        "level": level,
-                        "interaction": interaction
-                    }).execute()
-                except Exception as e:
-                    print(f"Warning: Could not insert {level} interaction '{interaction}': {e}")
-        
-        # 3. Insert food interactions
-        food_interactions = interactions.get("food_interactions", [])
-        for food in food_interactions:
-            try:
-                supabase.table("food_interactions").insert({
-                    "drug_id": drug_id,
-                    "description": food
-                }).execute()
-            except Exception as e:
-                print(f"Warning: Could not insert food interaction '{food}': {e}")
-        
-        # 4. Insert condition interactions
-        condition_interactions = interactions.get("condition_interactions", [])
-        for condition in condition_interactions:
-            try:
-                supabase.table("condition_interactions").insert({
-                    "drug_id": drug_id,
-                    "description": condition
-                }).execute()
-            except Exception as e:
-                print(f"Warning: Could not insert condition interaction '{condition}': {e}")
+def insert_rows(table: str, rows: List[Dict[str, Any]], describe: Callable[[Dict[str, Any]], str],
+                batch_size: int = DEFAULT_BATCH_SIZE, warn: Optional[Callable[[str], None]] = None) -> int:
+    """Insert rows into a table as multi-row batches, returning how many were written
+    
+    If a batch is rejected its rows are retried one at a time, so the warning for each
+    bad row is reported the same way as an individual insert would report it. Transport
+    errors and backend outages are raised instead; retrying row by row would not help.
+    Warnings go to warn when given, otherwise they are printed.
+    """
+    inserted = 0
+    batch_size = max(1, batch_size)
+    
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
         
-        # 5. Insert therapeutic duplications
-        therapeutic_duplications = interactions.get("therapeutic_duplications", [])
-        for dup in therapeutic_duplications:
+        if len(batch) > 1:
             try:
-                supabase.table("therapeutic_duplications").insert({
-                    "drug_id": drug_id,
-                    "description": dup
-                }).execute()
+                execute(supabase.table(table).insert(batch).execute, idempotent=False)
+                inserted += len(batch)
+                continue
             except Exception as e:
-                print(f"Warning: Could not insert therapeutic duplication '{dup}': {e}")
+                if not is_rejection(e):
+                    raise
+                # Fall through to per-row inserts to find the offending rows
         
-        # 6. Insert imprints if they exist
-        imprints = drug_data.get("imprints", [])
-        for imprint in imprints:
+        for row in batch:
             try:
-                supabase.table("drug_imprints").insert({
-                    "drug_id": drug_id,
-                    "imprint_code": imprint.get("imprint_code"),
-                    "image_url": imprint.get("image_url"),
-                    "description": imprint.get("description")
-                }).execute()
+                execute(supabase.table(table).insert(row).execute, idempotent=False)
+                inserted += 1
             except Exception as e:
-                print(f"Warning: Could not insert imprint code '{imprint.get('imprint_code')}': {e}")
+                if not is_rejection(e):
+                    raise
+                message = f"Could not insert {describe(row)}: {e}"
+                if warn is None:
+                    print(f"Warning: {message}")
+                else:
+                    warn(message)
+    
+    return inserted
+
+# How each child table's rows are named in insert warnings
+CHILD_ROW_LABELS = {
+    "drug_interactions": lambda row: f"{row['level']} interaction '{row['interaction']}'",
+    "food_interactions": lambda row: f"food interaction '{row['description']}'",
+    "condition_interactions": lambda row: f"condition interaction '{row['description']}'",
+    "therapeutic_duplications": lambda row: f"therapeutic duplication '{row['description']}'",
+    "drug_imprints": lambda row: f"imprint code '{row['imprint_code']}'",
+    "international_names": lambda row: f"international name '{row['name']}' for {row['country']}",
+}
+
+def insert_child_rows(table: str, drug_id: Any, rows: List[Dict[str, Any]],
+                      batch_size: int = DEFAULT_BATCH_SIZE, warn: Optional[Callable[[str], None]] = None) -> int:
+    """Insert child rows of one drug, returning how many were written"""
+    return insert_rows(table, [{"drug_id": drug_id, **row} for row in rows], CHILD_ROW_LABELS[table],
+                       batch_size, warn)
+
+def update_drug_indexes(drug: Dict[str, Any], children: Dict[str, List[Dict[str, Any]]]):
+    """Keep the in-memory indexes that are already loaded in this process current"""
+    from .interactions import interaction_index
+    from .imprints import imprint_index
+    from .aliases import alias_index
+    
+    for index, table in ((interaction_index, "drug_interactions"), (imprint_index, "drug_imprints"),
+                         (alias_index, "international_names")):
+        if index.is_warm:
+            index.add_drug(drug, children.get(table, []))
+
+def insert_drug(base_fields: Dict[str, Any], children: Dict[str, List[Dict[str, Any]]],
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                warn: Optional[Callable[[str], None]] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    """Insert a drugs row and its child rows, returning the drug and the rows written per child table
+    
+    The drug is None when its insert returned no row; child rows are then not written.
+    """
+    response = execute(supabase.table("drugs").insert(base_fields).execute, idempotent=False)
+    if not response.data or len(response.data) == 0:
+        return None, {}
+    
+    drug = response.data[0]
+    # Interactions, food and condition interactions, therapeutic duplications,
+    # imprints and international names, one table at a time
+    written = {table: insert_child_rows(table, drug["id"], rows, batch_size, warn) for table, rows in children.items()}
+    update_drug_indexes(drug, children)
+    return drug, written
+
+def import_drug_with_relationships(drug_data: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE,
+                                   verbose: bool = True, raise_errors: bool = False) -> Optional[str]:
+    """Import a drug and its relationships into the Supabase database
+    
+    Child rows are written with one multi-row insert per table (up to batch_size rows
+    per request) instead of one request per row. With raise_errors the failure is
+    raised to the caller instead of being printed and swallowed.
+    """
+    from .export import import_format_to_rows
+    
+    try:
+        base_fields, children = import_format_to_rows(drug_data)
+        drug, _ = insert_drug(base_fields, children, batch_size)
         
-        # 7. Insert international names if they exist
-        international_names = drug_data.get("international_names", [])
-        for int_name in international_names:
-            try:
-                supabase.table("international_names").insert({
-                    "drug_id": drug_id,
-                    "country": int_name.get("country"),
-                    "name": int_name.get("name")
-                }).execute()
-            except Exception as e:
-                print(f"Warning: Could not insert international name '{int_name.get('name')}' for {int_name.get('country')}: {e}")
+        if drug is None:
+            if raise_errors:
+                raise RuntimeError('Failed to insert drug')
+            print('Failed to insert drug')
+            return None
         
-        return drug_id
+        if verbose:
+            print(f"Successfully inserted drug with ID: {drug['id']}")
+        return drug["id"]
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error importing drug: {e}")
         return None
 
@@ -0,0 +1,202 @@
+import abc
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .retry import execute
+
+# Number of rows fetched per request while loading an index
+LOAD_PAGE_SIZE = 1000
+
+# Number of drug ids per in(...) query when fetching child rows
+ID_CHUNK_SIZE = 200
+
+# Every Nth refresh reloads everything, picking up child rows edited in place
+FULL_RELOAD_EVERY = 6
+
+def fetch_rows(client, table: str, columns: Iterable[str]) -> List[Dict[str, Any]]:
+    """Every row of a table, paged by id"""
+    rows = []
+    start = 0
+    while True:
+        query = client.table(table).select(", ".join(columns)).order("id").range(start, start + LOAD_PAGE_SIZE - 1)
+        page = execute(query.execute).data or []
+        rows.extend(page)
+        if len(page) < LOAD_PAGE_SIZE:
+            return rows
+        start += LOAD_PAGE_SIZE
+
+def fetch_drugs(client, columns: Iterable[str]) -> List[Dict[str, Any]]:
+    """Every row of the drugs table, paged by id"""
+    return fetch_rows(client, "drugs", columns)
+
+def fetch_child_rows(client, table: str, columns: Iterable[str], drug_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows of a drug child table grouped by drug id, one in(...) query per chunk of ids"""
+    rows: Dict[str, List[Dict[str, Any]]] = {drug_id: [] for drug_id in drug_ids}
+    for start in range(0, len(drug_ids), ID_CHUNK_SIZE):
+        chunk = drug_ids[start:start + ID_CHUNK_SIZE]
+        query = client.table(table).select(", ".join(("drug_id",) + tuple(columns))).in_("drug_id", chunk)
+        for row in execute(query.execute).data or []:
+            rows.setdefault(str(row["drug_id"]), []).append(row)
+    return rows
+
+class DrugIndex(abc.ABC):
+    """Base for in-memory indexes built from the drugs table plus one of its child tables
+
+    Subclasses name the child table and columns they need and implement _clear,
+    _add_drug and _remove_drug. The base class loads everything on first use and
+    afterwards refreshes incrementally: it lists the drugs and fetches child
+    rows only for drugs that are new or whose drugs row changed. Child rows
+    changed without touching their drug are picked up by the full reload every
+    FULL_RELOAD_EVERY refreshes.
+    """
+
+    label = "drug index"
+    drug_columns: Tuple[str, ...] = ("id", "name", "generic", "slug")
+    child_table = ""
+    child_columns: Tuple[str, ...] = ()
+
+    def __init__(self, refresh_interval: float = 300):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._drugs: Dict[str, Dict[str, Any]] = {}
+        self._warm = False
+        self._loaded_at: Optional[float] = None
+        self._refreshing = False
+        self._refreshes = 0
+
+    @property
+    def is_warm(self) -> bool:
+        return self._warm
+
+    def _fetch_children(self, client, drug_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        return fetch_child_rows(client, self.child_table, self.child_columns, drug_ids)
+
+    def load(self, client=None):
+        """(Re)build the whole index"""
+        if client is None:
+            from .supabase_client import supabase as client
+
+        drugs = fetch_drugs(client, self.drug_columns)
+        children = self._fetch_children(client, [str(drug["id"]) for drug in drugs])
+        with self._lock:
+            self._drugs.clear()
+            self._clear()
+            for drug in drugs:
+                self._drugs[str(drug["id"])] = drug
+                self._add_drug(drug, children.get(str(drug["id"]), []))
+            self._warm = True
+            self._loaded_at = time.monotonic()
+
+    def refresh(self, client=None) -> Dict[str, int]:
+        """Bring the index up to date, fetching child rows only for new or changed drugs
+
+        Costs one paged query over the drugs plus one query per chunk of new or
+        changed drugs, instead of re-reading every child row. Drugs that no longer
+        exist are dropped. Every FULL_RELOAD_EVERY-th refresh is a full load().
+        """
+        if client is None:
+            from .supabase_client import supabase as client
+
+        self._refreshes += 1
+        if self._refreshes % FULL_RELOAD_EVERY == 0:
+            # Only the drug part; subclasses refresh anything else themselves
+            DrugIndex.load(self, client)
+            return {"added": 0, "changed": 0, "removed": 0, "reloaded": len(self._drugs)}
+
+        current = {str(drug["id"]): drug for drug in fetch_drugs(client, self.drug_columns)}
+        with self._lock:
+            known = dict(self._drugs)
+        added = [drug_id for drug_id in current if drug_id not in known]
+        changed = [drug_id for drug_id in current if drug_id in known and current[drug_id] != known[drug_id]]
+        removed = set(known) - set(current)
+        children = self._fetch_children(client, added + changed) if added or changed else {}
+
+        with self._lock:
+            for drug_id in removed.union(changed):
+                self._drugs.pop(drug_id, None)
+                self._remove_drug(drug_id)
+            for drug_id in added + changed:
+                self._drugs[drug_id] = current[drug_id]
+                self._add_drug(current[drug_id], children.get(drug_id, []))
+            self._warm = True
+            self._loaded_at = time.monotonic()
+        return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+    def ensure_loaded(self, client=None):
+        """Load the index on first use; concurrent callers wait for the same load"""
+        if self._warm:
+            return
+        with self._load_lock:
+            if not self._warm:
+                self.load(client)
+
+    def warm_in_background(self, client=None) -> Optional[threading.Thread]:
+        """Load the index on a daemon thread unless it is warm or already loading"""
+        if self._warm or self._load_lock.locked():
+            return None
+
+        def run():
+            try:
+                self.ensure_loaded(client)
+            except Exception as e:
+                print(f"Warning: Could not build {self.label}: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_if_stale(self, client=None) -> Optional[threading.Thread]:
+        """Start a background refresh once refresh_interval has passed since the last one"""
+        with self._lock:
+            if not self._warm or self._refreshing or self.refresh_interval <= 0:
+                return None
+            if time.monotonic() - self._loaded_at < self.refresh_interval:
+                return None
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(client)
+            except Exception as e:
+                print(f"Warning: Could not refresh {self.label}: {e}")
+            finally:
+                self._refreshing = False
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def add_drug(self, drug: Dict[str, Any], rows: Iterable[Dict[str, Any]]):
+        """Index a drug and its child rows right after they were imported"""
+        if not drug or drug.get("id") is None:
+            return
+        drug_id = str(drug["id"])
+        with self._lock:
+            if drug_id in self._drugs:
+                self._remove_drug(drug_id)
+            self._drugs[drug_id] = drug
+            self._add_drug(drug, list(rows))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "warm": self._warm,
+                "refreshing": self._refreshing,
+                "drugs": len(self._drugs),
+                "age_seconds": None if self._loaded_at is None else round(time.monotonic() - self._loaded_at, 1),
+                "refresh_interval": self.refresh_interval,
+            }
+
+    @abc.abstractmethod
+    def _clear(self):
+        """Drop everything indexed from child rows"""
+
+    @abc.abstractmethod
+    def _add_drug(self, drug: Dict[str, Any], rows: List[Dict[str, Any]]):
+        """Index a drug and its child rows"""
+
+    @abc.abstractmethod
+    def _remove_drug(self, drug_id: str):
+        """Drop what _add_drug() indexed for a drug"""
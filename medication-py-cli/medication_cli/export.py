@@ -0,0 +1,140 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .retry import execute
+
+# Number of drugs fetched per page during a bulk export
+DEFAULT_PAGE_SIZE = 500
+
+# Child tables written by import_drug_with_relationships and the columns exported from each
+CHILD_TABLES = {
+    "drug_interactions": ("level", "interaction"),
+    "food_interactions": ("description",),
+    "condition_interactions": ("description",),
+    "therapeutic_duplications": ("description",),
+    "drug_imprints": ("imprint_code", "image_url", "description"),
+    "international_names": ("country", "name"),
+}
+
+INTERACTION_LEVELS = ("major", "moderate", "minor", "unknown")
+
+BASE_FIELDS = ("name", "slug", "consumer_info", "side_effects", "dosage", "pregnancy",
+               "breastfeeding", "classification", "drug_class", "generic", "otc")
+
+def embedded_select() -> str:
+    """select= value that embeds every child table in the drug row"""
+    children = ", ".join(f"{table}({', '.join(columns)})" for table, columns in CHILD_TABLES.items())
+    return f"*, {children}"
+
+def drug_to_import_format(drug: Dict[str, Any], children: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Convert a drugs row and its child rows back into the shape `import` reads"""
+    record = {field: drug.get(field) for field in BASE_FIELDS}
+
+    interactions: Dict[str, List[Any]] = {level: [] for level in INTERACTION_LEVELS}
+    for row in children.get("drug_interactions", []):
+        interactions.setdefault(row.get("level") or "unknown", []).append(row.get("interaction"))
+    interactions["food_interactions"] = [row.get("description") for row in children.get("food_interactions", [])]
+    interactions["condition_interactions"] = [row.get("description") for row in children.get("condition_interactions", [])]
+    interactions["therapeutic_duplications"] = [row.get("description") for row in children.get("therapeutic_duplications", [])]
+    record["interactions"] = interactions
+
+    record["imprints"] = [
+        {"imprint_code": row.get("imprint_code"), "image_url": row.get("image_url"), "description": row.get("description")}
+        for row in children.get("drug_imprints", [])
+    ]
+    record["international_names"] = [
+        {"country": row.get("country"), "name": row.get("name")}
+        for row in children.get("international_names", [])
+    ]
+    return record
+
+def import_format_to_rows(drug_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """Split a record in import format into its drugs row and child rows per table (without drug_id)
+
+    The inverse of drug_to_import_format.
+    """
+    base_fields = {field: drug_data.get(field) for field in BASE_FIELDS}
+    interactions = drug_data.get("interactions") or {}
+
+    children: Dict[str, List[Dict[str, Any]]] = {table: [] for table in CHILD_TABLES}
+    for level in INTERACTION_LEVELS:
+        for interaction in interactions.get(level) or []:
+            children["drug_interactions"].append({"level": level, "interaction": interaction})
+    for table in ("food_interactions", "condition_interactions", "therapeutic_duplications"):
+        children[table] = [{"description": description} for description in interactions.get(table) or []]
+    children["drug_imprints"] = [{
+        "imprint_code": imprint.get("imprint_code"),
+        "image_url": imprint.get("image_url"),
+        "description": imprint.get("description"),
+    } for imprint in drug_data.get("imprints") or []]
+    children["international_names"] = [{
+        "country": int_name.get("country"),
+        "name": int_name.get("name"),
+    } for int_name in drug_data.get("international_names") or []]
+    return base_fields, children
+
+def _fetch_children(client, drug_ids: List[Any]) -> Dict[Any, Dict[str, List[Dict[str, Any]]]]:
+    """Fetch child rows for a page of drugs with one in(...) query per child table"""
+    children: Dict[Any, Dict[str, List[Dict[str, Any]]]] = {drug_id: {} for drug_id in drug_ids}
+    for table, columns in CHILD_TABLES.items():
+        builder = client.table(table).select(", ".join(("drug_id",) + columns)).in_("drug_id", drug_ids)
+        for row in execute(builder.execute).data or []:
+            children.setdefault(row["drug_id"], {}).setdefault(table, []).append(row)
+    return children
+
+def _page_query(client, select: str, after: Optional[Any], page_size: int, name_filter: Optional[str]):
+    builder = client.table("drugs").select(select)
+    if name_filter:
+        builder = builder.ilike("name", f"%{name_filter}%")
+    if after is not None:
+        builder = builder.gt("id", after)
+    return builder.order("id").limit(page_size)
+
+def iter_drug_pages(client, page_size: int = DEFAULT_PAGE_SIZE, name_filter: Optional[str] = None,
+                    embed: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of drugs in import format, paging through the catalog by id
+
+    Each page costs one request when child tables can be embedded in the drug
+    query, otherwise one request for the drugs plus one per child table; the
+    number of requests never depends on the number of drugs in the page.
+    """
+    from postgrest.exceptions import APIError
+
+    after = None
+    while True:
+        if embed:
+            try:
+                drugs = execute(_page_query(client, embedded_select(), after, page_size, name_filter).execute).data or []
+                records = [drug_to_import_format(drug, drug) for drug in drugs]
+            except APIError:
+                # No foreign keys PostgREST can embed through; use batched child queries
+                embed = False
+
+        if not embed:
+            drugs = execute(_page_query(client, "*", after, page_size, name_filter).execute).data or []
+            children = _fetch_children(client, [drug["id"] for drug in drugs]) if drugs else {}
+            records = [drug_to_import_format(drug, children.get(drug["id"], {})) for drug in drugs]
+
+        if records:
+            yield records
+        if len(drugs) < page_size:
+            return
+        after = drugs[-1]["id"]
+
+def export_catalog(output: TextIO, client=None, page_size: int = DEFAULT_PAGE_SIZE,
+                   name_filter: Optional[str] = None) -> int:
+    """Stream every matching drug to output as NDJSON, returning how many were written
+
+    Only one page of drugs is held in memory at a time. The output can be fed
+    straight back into `import` or `bulk-import`.
+    """
+    if client is None:
+        from .supabase_client import supabase as client
+
+    count = 0
+    for records in iter_drug_pages(client, page_size=page_size, name_filter=name_filter):
+        for record in records:
+            output.write(json.dumps(record) + "\n")
+        output.flush()
+        count += len(records)
+    return count
@@ -0,0 +1,177 @@
+import bisect
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .drug_index import DrugIndex
+from .search_index import normalize
+
+# Most candidate drugs returned by one lookup
+DEFAULT_LIMIT = 20
+
+# Shortest partial code matched anywhere inside an imprint (shorter codes only match as prefixes)
+MIN_PARTIAL_LENGTH = 2
+
+# Match kinds from best to worst
+MATCH_KINDS = ("exact", "prefix", "partial")
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+def normalize_code(code: Optional[str]) -> str:
+    """Fold an imprint code to upper-case letters and digits ("m 3-67" -> "M367")"""
+    if not code:
+        return ""
+    return _NON_ALNUM.sub("", str(code).upper())
+
+def _bigrams(code: str) -> Set[str]:
+    return {code[i:i + 2] for i in range(len(code) - 1)}
+
+class ImprintIndex(DrugIndex):
+    """In-memory index of pill imprint codes from drug_imprints
+
+    Codes are stored normalized, so case, spaces and punctuation do not matter.
+    Exact matches are a dict lookup, prefix matches a bisect over the sorted
+    codes and partial matches intersect bigram postings before a substring check.
+    """
+
+    label = "imprint index"
+    child_table = "drug_imprints"
+    child_columns = ("imprint_code", "image_url", "description")
+
+    def __init__(self, refresh_interval: float = 300):
+        super().__init__(refresh_interval)
+        # code -> (drug id, imprint row, padded normalized description)
+        self._by_code: Dict[str, List[Tuple[str, Dict[str, Any], str]]] = {}
+        self._sorted_codes: List[str] = []
+        self._bigrams: Dict[str, Set[str]] = {}
+        self._drug_codes: Dict[str, Set[str]] = {}
+
+    def _clear(self):
+        self._by_code.clear()
+        self._sorted_codes = []
+        self._bigrams.clear()
+        self._drug_codes.clear()
+
+    def _add_drug(self, drug: Dict[str, Any], rows: List[Dict[str, Any]]):
+        drug_id = str(drug["id"])
+        codes = self._drug_codes.setdefault(drug_id, set())
+        for row in rows:
+            code = normalize_code(row.get("imprint_code"))
+            if not code:
+                continue
+            entries = self._by_code.get(code)
+            if entries is None:
+                entries = self._by_code[code] = []
+                bisect.insort(self._sorted_codes, code)
+                for gram in _bigrams(code):
+                    self._bigrams.setdefault(gram, set()).add(code)
+            entries.append((drug_id, row, f" {normalize(row.get('description'))} "))
+            # Keep drugs sharing a code in name order so lookups can stop early
+            entries.sort(key=lambda entry: self._drugs.get(entry[0], {}).get("name") or "")
+            codes.add(code)
+
+    def _remove_drug(self, drug_id: str):
+        for code in self._drug_codes.pop(drug_id, ()):
+            entries = [entry for entry in self._by_code.get(code, []) if entry[0] != drug_id]
+            if entries:
+                self._by_code[code] = entries
+                continue
+            self._by_code.pop(code, None)
+            position = bisect.bisect_left(self._sorted_codes, code)
+            if position < len(self._sorted_codes) and self._sorted_codes[position] == code:
+                del self._sorted_codes[position]
+            for gram in _bigrams(code):
+                codes = self._bigrams.get(gram)
+                if codes is not None:
+                    codes.discard(code)
+                    if not codes:
+                        del self._bigrams[gram]
+
+    def _matching_codes(self, code: str) -> Dict[str, int]:
+        """Indexed codes matching code, mapped to the position of their kind in MATCH_KINDS"""
+        matches: Dict[str, int] = {}
+        if code in self._by_code:
+            matches[code] = 0
+
+        start = bisect.bisect_left(self._sorted_codes, code)
+        for candidate in self._sorted_codes[start:]:
+            if not candidate.startswith(code):
+                break
+            matches.setdefault(candidate, 1)
+
+        if len(code) >= MIN_PARTIAL_LENGTH:
+            postings = sorted((self._bigrams.get(gram, set()) for gram in _bigrams(code)), key=len)
+            candidates = set(postings[0]) if postings else set()
+            for codes in postings[1:]:
+                candidates &= codes
+            for candidate in candidates:
+                if code in candidate:
+                    matches.setdefault(candidate, 2)
+        return matches
+
+    def lookup(self, code: str, color: Optional[str] = None, shape: Optional[str] = None,
+               limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """Candidate drugs for a (partial) imprint code, best matches first
+
+        Exact codes rank before codes starting with the query, which rank before
+        codes merely containing it; ties go to the code closest in length to the
+        query, then to the code and drug name in alphabetical order. color and
+        shape must appear as words in the imprint description. Each drug is
+        listed once, with every imprint of it that matched.
+        """
+        code = normalize_code(code)
+        required = [f" {normalize(text)} " for text in (color, shape) if normalize(text)]
+        if not code:
+            return []
+
+        with self._lock:
+            matches = self._matching_codes(code)
+            ranked_codes = sorted(matches, key=lambda candidate: (matches[candidate], len(candidate), candidate))
+
+            # Walk codes best first and stop at the first code after the limit is filled
+            ranks: Dict[str, Tuple[int, int, str]] = {}
+            for candidate in ranked_codes:
+                if len(ranks) >= limit:
+                    break
+                rank = (matches[candidate], len(candidate) - len(code), candidate)
+                for drug_id, row, description in self._by_code[candidate]:
+                    if drug_id not in ranks and all(text in description for text in required):
+                        ranks[drug_id] = rank
+
+            chosen = sorted(ranks, key=lambda drug_id: (ranks[drug_id], self._drugs.get(drug_id, {}).get("name") or ""))
+            results = []
+            for drug_id in chosen[:limit]:
+                drug = self._drugs.get(drug_id, {})
+                results.append({
+                    "drug_id": drug.get("id", drug_id),
+                    "name": drug.get("name"),
+                    "generic": drug.get("generic"),
+                    "match": MATCH_KINDS[ranks[drug_id][0]],
+                    "imprints": self._matched_imprints(drug_id, matches, required),
+                })
+            return results
+
+    def _matched_imprints(self, drug_id: str, matches: Dict[str, int], required: List[str]) -> List[Dict[str, Any]]:
+        imprints = []
+        codes = sorted((code for code in self._drug_codes.get(drug_id, ()) if code in matches),
+                       key=lambda code: (matches[code], code))
+        for code in codes:
+            for owner, row, description in self._by_code[code]:
+                if owner == drug_id and all(text in description for text in required):
+                    imprints.append({
+                        "imprint_code": row.get("imprint_code"),
+                        "description": row.get("description"),
+                        "image_url": row.get("image_url"),
+                    })
+        return imprints
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **super().stats(),
+                "codes": len(self._by_code),
+                "imprints": sum(len(entries) for entries in self._by_code.values()),
+            }
+
+# Shared index used by the API and CLI; refreshed in the background after this many seconds
+imprint_index = ImprintIndex(refresh_interval=float(os.getenv("MEDICATION_IMPRINT_REFRESH", "300")))
@@ -0,0 +1,216 @@
+import os
+import re
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .drug_index import DrugIndex
+from .search_index import normalize
+
+# Interaction levels from most to least severe
+SEVERITY_LEVELS = ("major", "moderate", "minor", "unknown")
+
+# Most medications accepted in one interaction check
+MAX_CHECK_ITEMS = 100
+
+_QUALIFIER = re.compile(r"\s*\([^)]*\)")
+
+def _severity(level: Optional[str]) -> int:
+    """Position of level in SEVERITY_LEVELS (lower is more severe)"""
+    try:
+        return SEVERITY_LEVELS.index(level or "unknown")
+    except ValueError:
+        return len(SEVERITY_LEVELS) - 1
+
+def name_keys(text: Optional[str]) -> Set[str]:
+    """Normalized lookup keys for a drug name: the full name and the name without qualifiers
+
+    "Alcohol (chronic use)" is reachable as both "alcohol chronic use" and "alcohol".
+    """
+    keys = {normalize(text)}
+    if text and "(" in text:
+        keys.add(normalize(_QUALIFIER.sub(" ", str(text))))
+    keys.discard("")
+    return keys
+
+def parse_medications(value: Any) -> List[str]:
+    """Medication names from a JSON list, {"medications": [...]} or a comma-separated string"""
+    if isinstance(value, dict):
+        value = value.get("medications")
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ValueError("Expected a list of medications")
+    names = [str(item).strip() for item in value if item is not None and str(item).strip()]
+    if len(names) < 2:
+        raise ValueError("At least two medications are required")
+    if len(names) > MAX_CHECK_ITEMS:
+        raise ValueError(f"At most {MAX_CHECK_ITEMS} medications per check")
+    return names
+
+class InteractionIndex(DrugIndex):
+    """In-memory drug-drug interaction graph built from drugs and drug_interactions
+
+    Every drug name, generic name and slug maps to one node for the drug, and each
+    interaction row becomes an undirected edge to the node of the interacting
+    drug (or to the normalized interaction text when it is not a known drug). A
+    check is then one dictionary lookup per pair of medications.
+    """
+
+    label = "interaction index"
+    child_table = "drug_interactions"
+    child_columns = ("level", "interaction")
+
+    def __init__(self, refresh_interval: float = 300):
+        super().__init__(refresh_interval)
+        self._aliases: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        self._drug_keys: Dict[str, Set[str]] = {}
+        self._term_keys: Dict[str, Set[str]] = {}
+        self._drug_rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._edges: Dict[str, Dict[str, Tuple[int, str, str]]] = {}
+
+    def _clear(self):
+        self._aliases.clear()
+        self._names.clear()
+        self._drug_keys.clear()
+        self._term_keys.clear()
+        self._drug_rows.clear()
+        self._edges.clear()
+
+    def _resolve(self, text: Optional[str]) -> Optional[str]:
+        """Node a name refers to, preferring the most specific key; None when it is unknown"""
+        for key in sorted(name_keys(text), key=len, reverse=True):
+            node = self._aliases.get(key)
+            if node is not None:
+                return node
+        return None
+
+    def _term(self, text: Optional[str]) -> Optional[str]:
+        """Node for interaction text, creating a term node when it names no known drug"""
+        node = self._resolve(text)
+        if node is not None:
+            return node
+        keys = name_keys(text)
+        if not keys:
+            return None
+        node = f"term:{normalize(text)}"
+        for key in keys:
+            self._aliases[key] = node
+        self._term_keys[node] = keys
+        return node
+
+    def _add_drug(self, drug: Dict[str, Any], interactions: List[Dict[str, Any]]):
+        drug_id = str(drug["id"])
+        node = f"drug:{drug_id}"
+        keys = set()
+        for field in ("name", "generic", "slug"):
+            keys |= name_keys(drug.get(field))
+        for key in keys:
+            existing = self._aliases.get(key)
+            if existing is None:
+                self._aliases[key] = node
+            elif existing.startswith("term:"):
+                # Interactions recorded against this name before the drug was known now belong to it
+                self._merge(existing, node)
+        self._names[node] = drug.get("name") or drug_id
+        self._drug_keys[drug_id] = keys
+        self._drug_rows[drug_id] = interactions
+
+        source = self._names[node]
+        for row in interactions:
+            other = self._term(row.get("interaction"))
+            if other is None or other == node:
+                continue
+            self._link(node, other, _severity(row.get("level")), source, row.get("interaction") or "")
+
+    def _remove_drug(self, drug_id: str):
+        keys = self._drug_keys.pop(drug_id, None)
+        self._drug_rows.pop(drug_id, None)
+        if keys is None:
+            return
+        node = f"drug:{drug_id}"
+        for key in keys:
+            if self._aliases.get(key) == node:
+                del self._aliases[key]
+        self._names.pop(node, None)
+        for other in self._edges.pop(node, {}):
+            edges = self._edges.get(other)
+            if edges is not None:
+                edges.pop(node, None)
+                if not edges:
+                    del self._edges[other]
+        # Interactions other drugs record against this one remain, under its name
+        for other_id, rows in self._drug_rows.items():
+            other_node = f"drug:{other_id}"
+            source = self._names.get(other_node, other_id)
+            for row in rows:
+                if name_keys(row.get("interaction")) & keys:
+                    term = self._term(row.get("interaction"))
+                    if term is not None and term != other_node:
+                        self._link(other_node, term, _severity(row.get("level")), source,
+                                   row.get("interaction") or "")
+
+    def _link(self, a: str, b: str, severity: int, source: str, text: str):
+        """Record an undirected edge, keeping the most severe interaction for the pair"""
+        existing = self._edges.get(a, {}).get(b)
+        if existing is not None and existing[0] <= severity:
+            return
+        self._edges.setdefault(a, {})[b] = (severity, source, text)
+        self._edges.setdefault(b, {})[a] = (severity, source, text)
+
+    def _merge(self, term: str, node: str):
+        """Fold a term node into the drug node that now owns its name"""
+        for key in self._term_keys.pop(term, ()):
+            self._aliases[key] = node
+        edges = self._edges.pop(term, None)
+        if not edges:
+            return
+        for other, (severity, source, text) in edges.items():
+            other_edges = self._edges.get(other)
+            if other_edges is not None:
+                other_edges.pop(term, None)
+            if other != node:
+                self._link(node, other, severity, source, text)
+
+    def check(self, medications: List[str]) -> Dict[str, Any]:
+        """Every pairwise interaction among medications, grouped by severity"""
+        with self._lock:
+            resolved = []
+            for name in medications:
+                resolved.append((name, self._resolve(name)))
+
+            grouped: Dict[str, List[Dict[str, Any]]] = {level: [] for level in SEVERITY_LEVELS}
+            for (name_a, node_a), (name_b, node_b) in combinations(resolved, 2):
+                if node_a is None or node_b is None or node_a == node_b:
+                    continue
+                edge = self._edges.get(node_a, {}).get(node_b)
+                if edge is None:
+                    continue
+                severity, source, text = edge
+                grouped[SEVERITY_LEVELS[severity]].append({
+                    "medications": [name_a, name_b],
+                    "level": SEVERITY_LEVELS[severity],
+                    "source": source,
+                    "interaction": text,
+                })
+
+            return {
+                "medications": [{
+                    "input": name,
+                    "matched": node is not None and node.startswith("drug:"),
+                    "name": self._names.get(node),
+                } for name, node in resolved],
+                "interactions": grouped,
+                "count": sum(len(items) for items in grouped.values()),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **super().stats(),
+                "aliases": len(self._aliases),
+                "edges": sum(len(edges) for edges in self._edges.values()) // 2,
+            }
+
+# Shared index used by the API and CLI; refreshed in the background after this many seconds
+interaction_index = InteractionIndex(refresh_interval=float(os.getenv("MEDICATION_INTERACTION_REFRESH", "300")))
@@ -0,0 +1,250 @@
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Log Supabase calls and API requests slower than this (0 disables the slow-call log)
+SLOW_CALL_MS = float(os.getenv("MEDICATION_SLOW_CALL_MS", "0"))
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(**labels), 0)
+
+    def samples(self, constant: Labels = ()) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(constant + labels)} {_format_value(value)}"
+                    for labels, value in sorted(self._values.items())]
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[position] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += value
+
+    def snapshot(self) -> Dict[Labels, Dict[str, Any]]:
+        """Count, sum and estimated quantiles for every label set"""
+        with self._lock:
+            items = [(labels, list(entry)) for labels, entry in self._values.items()]
+        result = {}
+        for labels, entry in items:
+            count = sum(entry[:-1])
+            result[labels] = {
+                "count": count,
+                "sum": entry[-1],
+                "p50": self._quantile(entry, count, 0.50),
+                "p95": self._quantile(entry, count, 0.95),
+                "p99": self._quantile(entry, count, 0.99),
+            }
+        return result
+
+    def _quantile(self, entry: List[float], count: int, fraction: float) -> float:
+        """Upper bound of the bucket holding the given quantile"""
+        target = fraction * count
+        seen = 0
+        for position, bound in enumerate(self.buckets):
+            seen += entry[position]
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def samples(self, constant: Labels = ()) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        lines = []
+        for labels, entry in items:
+            labels = constant + labels
+            cumulative = 0
+            for position, bound in enumerate(self.buckets):
+                cumulative += entry[position]
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            cumulative += entry[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """Metrics of this process plus collectors that report other components' state
+
+    Each process keeps its own values. Pre-forked workers label every sample with
+    their worker slot (see label_process()), so their counters stay separate
+    series that Prometheus can sum instead of one series that jumps between workers.
+    """
+
+    def __init__(self):
+        self.constant_labels: Labels = ()
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]):
+        """Add a callable yielding (name, type, help, labels, value) samples at scrape time"""
+        self._collectors.append(collector)
+
+    def label_process(self, **labels):
+        """Add labels to every sample this process renders, e.g. worker=<slot> after fork"""
+        self.constant_labels = _labels(**labels)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            samples = metric.samples(self.constant_labels)
+            if samples:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(samples)
+
+        described = set()
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                if name not in described:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(self.constant_labels + _labels(**labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Metrics shared by the CLI and API of this process
+registry = Registry()
+
+db_call_seconds = registry.histogram(
+    "medication_db_call_duration_seconds", "Duration of individual Supabase requests by table and operation")
+db_retries = registry.counter(
+    "medication_db_retries_total", "Supabase requests retried after a transient failure")
+db_errors = registry.counter(
+    "medication_db_errors_total", "Failed Supabase requests by table, operation and kind (timeout or error)")
+db_deadlines = registry.counter(
+    "medication_db_deadline_exceeded_total", "Operations that gave up because their deadline budget ran out")
+http_request_seconds = registry.histogram(
+    "medication_http_request_duration_seconds", "Duration of API requests by route, method and status")
+
+def describe_operation(operation: Callable) -> Tuple[str, str]:
+    """(table, operation) of a query builder's bound execute method, for labelling"""
+    builder = getattr(operation, "__self__", None)
+    request = getattr(builder, "request", None)
+    path = getattr(request, "path", None)
+    if path is None:
+        return "unknown", "unknown"
+    table = str(path).rstrip("/").rsplit("/", 1)[-1]
+    method = str(getattr(getattr(request, "http_method", None), "value", getattr(request, "http_method", "")))
+    if method == "POST":
+        prefer = str(getattr(request, "headers", {}).get("prefer", ""))
+        return table, "upsert" if "merge-duplicates" in prefer else "insert"
+    return table, {"GET": "select", "HEAD": "select", "PATCH": "update", "DELETE": "delete"}.get(method, method.lower() or "unknown")
+
+def _is_timeout(e: BaseException) -> bool:
+    if isinstance(e, TimeoutError):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(e, httpx.TimeoutException)
+
+def record_call(table: str, operation: str, seconds: float, error: Optional[BaseException] = None):
+    """Record one Supabase request (a single attempt of an operation)"""
+    db_call_seconds.observe(seconds, table=table, operation=operation)
+    if error is not None:
+        db_errors.inc(table=table, operation=operation, kind="timeout" if _is_timeout(error) else "error")
+    log_if_slow(f"{operation} {table}", seconds, error)
+
+def record_retry(table: str, operation: str):
+    db_retries.inc(table=table, operation=operation)
+
+def record_deadline(table: str, operation: str):
+    db_deadlines.inc(table=table, operation=operation)
+
+def record_request(route: str, method: str, status: int, seconds: float):
+    """Record one API request"""
+    http_request_seconds.observe(seconds, route=route, method=method, status=status)
+    log_if_slow(f"{method} {route} -> {status}", seconds)
+
+def log_if_slow(what: str, seconds: float, error: Optional[BaseException] = None):
+    if SLOW_CALL_MS and seconds * 1000 >= SLOW_CALL_MS:
+        outcome = f" ({type(error).__name__})" if error is not None else ""
+        print(f"Slow call: {what} took {seconds * 1000:.1f} ms{outcome}", file=sys.stderr)
+
+def summary() -> List[Dict[str, Any]]:
+    """Per table/operation totals of the Supabase requests made so far"""
+    rows = []
+    for labels, stats in sorted(db_call_seconds.snapshot().items()):
+        labels = dict(labels)
+        rows.append({
+            "table": labels.get("table"),
+            "operation": labels.get("operation"),
+            "calls": stats["count"],
+            "total_ms": round(stats["sum"] * 1000, 1),
+            "avg_ms": round(stats["sum"] * 1000 / stats["count"], 1) if stats["count"] else 0.0,
+            "retries": db_retries.value(table=labels.get("table"), operation=labels.get("operation")),
+            "errors": (db_errors.value(table=labels.get("table"), operation=labels.get("operation"), kind="error")
+                       + db_errors.value(table=labels.get("table"), operation=labels.get("operation"), kind="timeout")),
+        })
+    return rows
@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+# Column used for keyset pagination; unique and never changes for a row
+CURSOR_KEY = "id"
+
+# Upper bound on the page size a client may ask for
+MAX_PAGE_SIZE = 1000
+
+_COLUMN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated fields= parameter into a list of column names
+
+    Returns None when all columns were requested. The cursor key is always
+    included so that the next page can be requested. Raises ValueError on
+    anything that is not a plain column name.
+    """
+    if not value:
+        return None
+    fields = []
+    for field in value.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        if not _COLUMN.match(field):
+            raise ValueError(f"Invalid field name '{field}'")
+        if field not in fields:
+            fields.append(field)
+    if not fields:
+        return None
+    if CURSOR_KEY not in fields:
+        fields.insert(0, CURSOR_KEY)
+    return fields
+
+def select_columns(fields: Optional[List[str]]) -> str:
+    """PostgREST select= value for the requested fields"""
+    return ",".join(fields) if fields else "*"
+
+def project(row: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Restrict an already fetched row to the requested fields"""
+    if not fields:
+        return row
+    return {field: row.get(field) for field in fields}
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past row"""
+    payload = json.dumps({CURSOR_KEY: row[CURSOR_KEY]}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Any]:
+    """Sort-key value encoded in a cursor; raises ValueError if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))[CURSOR_KEY]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def apply_page(builder, after: Optional[Any], limit: int):
+    """Order a query by the cursor key and start it after the given key value"""
+    builder = builder.order(CURSOR_KEY)
+    if after is not None:
+        builder = builder.gt(CURSOR_KEY, after)
+    return builder.limit(limit)
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def compute_etag(data: Any) -> str:
+    """Strong ETag over the JSON representation of a response body"""
+    body = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.replace("W/", "", 1) == etag for tag in candidates)
+
+def page_headers(rows: List[Dict[str, Any]], limit: int, path: str, args: Dict[str, str]) -> Dict[str, str]:
+    """ETag plus X-Next-Cursor/Link headers pointing at the next page, if there may be one"""
+    headers = {"ETag": compute_etag(rows)}
+    if len(rows) >= limit and rows and CURSOR_KEY in rows[-1]:
+        cursor = encode_cursor(rows[-1])
+        next_args = {**args, "cursor": cursor}
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{path}?{urlencode(next_args)}>; rel="next"'
+    return headers
@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .retry import execute
+
+if sys.platform != "win32":
+    import fcntl
+else:
+    fcntl = None
+
+# Location of the SQLite replica file
+REPLICA_PATH = os.getenv("MEDICATION_REPLICA_PATH", os.path.expanduser("~/.cache/medication-cli/replica.sqlite3"))
+
+# Reads are served from the replica only while its last sync is at most this old
+REPLICA_MAX_STALENESS = float(os.getenv("MEDICATION_REPLICA_MAX_STALENESS", "300"))  # seconds
+
+# Seconds between background syncs while the API is running
+REPLICA_SYNC_INTERVAL = float(os.getenv("MEDICATION_REPLICA_SYNC_INTERVAL", "60"))
+
+# Every Nth background sync also removes rows that were deleted upstream
+RECONCILE_EVERY = 10
+
+# Tables kept in sync by their updated_at column (see "Local read replica" in the README)
+SYNCED_TABLES = ("medications", "drugs")
+
+# Number of rows fetched per request while syncing
+SYNC_PAGE_SIZE = 1000
+
+# PostgREST error code for a column that does not exist
+UNDEFINED_COLUMN = "42703"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    tbl TEXT NOT NULL,
+    id NOT NULL,
+    name_key TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (tbl, id)
+);
+CREATE INDEX IF NOT EXISTS rows_name ON rows (tbl, name_key);
+CREATE TABLE IF NOT EXISTS sync_state (
+    tbl TEXT PRIMARY KEY,
+    high_water TEXT,
+    high_water_id,
+    synced_at REAL,
+    full_sync INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def _id_variants(value: Any) -> List[Any]:
+    """An id as given plus its integer form, since path parameters arrive as strings"""
+    variants = [value]
+    if isinstance(value, str) and value.isdigit():
+        variants.append(int(value))
+    return variants
+
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST or=(...) filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _like_pattern(text: str) -> str:
+    return "%" + text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+class Replica:
+    """Local SQLite copy of the medication tables, kept current by incremental syncs
+
+    Each sync pulls only the rows whose updated_at is past the high-water mark of
+    the previous sync. A full sync swaps a table's rows in one transaction, so
+    readers see either the old or the new copy. Rows are stored as JSON so reads
+    return exactly what Supabase would.
+    """
+
+    def __init__(self, path: str = REPLICA_PATH, max_staleness: float = REPLICA_MAX_STALENESS):
+        self.path = path
+        self.max_staleness = max_staleness
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._syncer_file = None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the calling thread (SQLite connections are not shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL lets readers keep going while a sync is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reset(self):
+        """Forget connections and the sync thread inherited from a parent process after fork"""
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        if self._syncer_file is not None:
+            self._syncer_file.close()
+            self._syncer_file = None
+
+    # Sync
+
+    def sync(self, client=None, full: bool = False, reconcile: bool = False) -> Dict[str, Dict[str, int]]:
+        """Pull changes from Supabase, returning per-table counts of synced and removed rows
+
+        full re-reads every row and replaces each table in one transaction;
+        reconcile also lists the ids of each table so rows deleted upstream are
+        removed locally.
+        """
+        if client is None:
+            from .supabase_client import supabase as client
+
+        with self._sync_lock:
+            results = {}
+            for table in SYNCED_TABLES:
+                if full:
+                    changed, removed = self._copy_table(client, table)
+                else:
+                    changed = self._sync_table(client, table)
+                    removed = self._reconcile(client, table) if reconcile else []
+                results[table] = {"synced": len(changed), "removed": len(removed)}
+            return results
+
+    def _state(self, table: str):
+        row = self._connect().execute(
+            "SELECT high_water, high_water_id, synced_at, full_sync FROM sync_state WHERE tbl = ?", (table,)).fetchone()
+        return row or (None, None, None, 0)
+
+    def _pages(self, client, table: str, high_water=None, high_water_id=None) -> Iterator[List[Dict[str, Any]]]:
+        """Rows changed after (high_water, high_water_id), a page at a time in (updated_at, id) order"""
+        from postgrest.exceptions import APIError
+
+        while True:
+            builder = client.table(table).select("*")
+            if high_water is not None:
+                # Keyset on (updated_at, id) so rows sharing a timestamp are never skipped
+                builder = builder.or_(f"updated_at.gt.{_quote(high_water)},"
+                                      f"and(updated_at.eq.{_quote(high_water)},id.gt.{_quote(high_water_id)})")
+            try:
+                page = execute(builder.order("updated_at").order("id").limit(SYNC_PAGE_SIZE).execute).data or []
+            except APIError as e:
+                if e.code == UNDEFINED_COLUMN:
+                    raise RuntimeError(f"Table {table} has no updated_at column to sync by; "
+                                       "apply the replica schema from the README") from e
+                raise
+            yield page
+            if len(page) < SYNC_PAGE_SIZE:
+                return
+            high_water, high_water_id = page[-1].get("updated_at"), page[-1]["id"]
+
+    def _sync_table(self, client, table: str) -> List[Any]:
+        """Upsert rows changed since the high-water mark and return their ids"""
+        high_water, high_water_id, _, _ = self._state(table)
+        conn = self._connect()
+        changed = []
+        for page in self._pages(client, table, high_water, high_water_id):
+            changed.extend(row["id"] for row in page)
+            if page:
+                high_water, high_water_id = page[-1].get("updated_at"), page[-1]["id"]
+            # Each page is stored together with the mark it advances to
+            with conn:
+                self._store(conn, table, page)
+                self._save_state(conn, table, high_water, high_water_id, None, 0)
+
+        with conn:
+            self._save_state(conn, table, high_water, high_water_id, time.time(), 0)
+        return changed
+
+    def _copy_table(self, client, table: str) -> Tuple[List[Any], List[Any]]:
+        """Replace every local row of table in one transaction, returning the synced and removed ids"""
+        rows, high_water, high_water_id = [], None, None
+        for page in self._pages(client, table):
+            rows.extend(page)
+            if page:
+                high_water, high_water_id = page[-1].get("updated_at"), page[-1]["id"]
+
+        conn = self._connect()
+        with conn:
+            previous = [row[0] for row in conn.execute("SELECT id FROM rows WHERE tbl = ?", (table,))]
+            conn.execute("DELETE FROM rows WHERE tbl = ?", (table,))
+            self._store(conn, table, rows)
+            self._save_state(conn, table, high_water, high_water_id, time.time(), 1)
+        synced = {row["id"] for row in rows}
+        return [row["id"] for row in rows], [row_id for row_id in previous if row_id not in synced]
+
+    def _reconcile(self, client, table: str) -> List[Any]:
+        """Delete local rows whose ids no longer exist upstream, returning their ids"""
+        remote, after = set(), None
+        while True:
+            builder = client.table(table).select("id")
+            if after is not None:
+                builder = builder.gt("id", after)
+            page = execute(builder.order("id").limit(SYNC_PAGE_SIZE).execute).data or []
+            remote.update(row["id"] for row in page)
+            if len(page) < SYNC_PAGE_SIZE:
+                break
+            after = page[-1]["id"]
+
+        conn = self._connect()
+        local = [row[0] for row in conn.execute("SELECT id FROM rows WHERE tbl = ?", (table,))]
+        removed = [row_id for row_id in local if row_id not in remote]
+        with conn:
+            conn.executemany("DELETE FROM rows WHERE tbl = ? AND id = ?", [(table, row_id) for row_id in removed])
+        return removed
+
+    def _store(self, conn: sqlite3.Connection, table: str, rows: Iterable[Dict[str, Any]]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO rows (tbl, id, name_key, data) VALUES (?, ?, ?, ?)",
+            [(table, row["id"], (row.get("name") or "").lower(), json.dumps(row)) for row in rows])
+
+    def _save_state(self, conn: sqlite3.Connection, table: str, high_water, high_water_id,
+                    synced_at: Optional[float], full_sync: int):
+        conn.execute(
+            "INSERT INTO sync_state (tbl, high_water, high_water_id, synced_at, full_sync) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(tbl) DO UPDATE SET high_water = excluded.high_water, "
+            "high_water_id = excluded.high_water_id, full_sync = excluded.full_sync, "
+            "synced_at = COALESCE(excluded.synced_at, sync_state.synced_at)",
+            (table, high_water, high_water_id, synced_at, full_sync))
+
+    def upsert(self, table: str, rows: Iterable[Dict[str, Any]]):
+        """Apply rows written through this process without waiting for the next sync"""
+        conn = self._connect()
+        with conn:
+            self._store(conn, table, [row for row in rows if row and row.get("id") is not None])
+
+    def remove(self, table: str, row_ids: Iterable[Any]):
+        ids = [variant for row_id in row_ids for variant in _id_variants(row_id)]
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM rows WHERE tbl = ? AND id = ?", [(table, row_id) for row_id in ids])
+
+    def claim_syncer(self) -> bool:
+        """Whether this process is the one that syncs the replica file in the background
+
+        The first process to take an exclusive lock on the file next to the
+        replica keeps it until it exits; others keep serving reads and try again
+        on their next round, so a host syncs once however many workers it runs.
+        """
+        if self._syncer_file is not None or fcntl is None:
+            return True
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._syncer_file = lock_file
+        return True
+
+    def start_background_sync(self, interval: float = REPLICA_SYNC_INTERVAL, client=None) -> threading.Thread:
+        """Sync on a daemon thread every interval seconds, reconciling deletions every few rounds
+
+        Only the process holding the syncer lock (see claim_syncer()) syncs.
+        """
+        def run():
+            rounds = 0
+            while True:
+                if self.claim_syncer():
+                    try:
+                        self.sync(client, reconcile=rounds % RECONCILE_EVERY == 0)
+                    except Exception as e:
+                        print(f"Warning: Could not sync replica: {e}")
+                    rounds += 1
+                time.sleep(interval)
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=run, daemon=True)
+            self._thread.start()
+        return self._thread
+
+    # Reads
+
+    def age(self, table: str) -> Optional[float]:
+        """Seconds since table was last synced, or None if it never was"""
+        synced_at = self._state(table)[2]
+        return None if synced_at is None else max(0.0, time.time() - synced_at)
+
+    def is_fresh(self, table: str) -> bool:
+        age = self.age(table)
+        return age is not None and age <= self.max_staleness
+
+    def has_data(self, table: str) -> bool:
+        return self.age(table) is not None
+
+    def get(self, table: str, row_id: Any) -> Optional[Dict[str, Any]]:
+        rows = self.get_many(table, [row_id])
+        return rows[0] if rows else None
+
+    def get_many(self, table: str, row_ids: List[Any]) -> List[Dict[str, Any]]:
+        ids = [variant for row_id in row_ids for variant in _id_variants(row_id)]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        cursor = self._connect().execute(
+            f"SELECT data FROM rows WHERE tbl = ? AND id IN ({placeholders})", [table] + ids)
+        return [json.loads(data) for data, in cursor]
+
+    def find_by_name(self, table: str, name: str) -> Optional[Dict[str, Any]]:
+        """Row whose name equals name ignoring case, like ilike("name", name)"""
+        row = self._connect().execute(
+            "SELECT data FROM rows WHERE tbl = ? AND name_key = ? LIMIT 1", (table, name.lower())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, table: str, query: str = "", limit: int = 10, after: Any = None) -> List[Dict[str, Any]]:
+        """Rows whose name contains query, ordered by id and starting after a cursor value"""
+        sql = "SELECT data FROM rows WHERE tbl = ?"
+        params: List[Any] = [table]
+        if query:
+            sql += " AND name_key LIKE ? ESCAPE '\\'"
+            params.append(_like_pattern(query))
+        if after is not None:
+            sql += " AND id > ?"
+            params.append(after)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return [json.loads(data) for data, in self._connect().execute(sql, params)]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT tbl, COUNT(*) FROM rows GROUP BY tbl").fetchall())
+        tables = {}
+        for table in SYNCED_TABLES:
+            high_water, _, _, full_sync = self._state(table)
+            age = self.age(table)
+            tables[table] = {
+                "rows": counts.get(table, 0),
+                "high_water": high_water,
+                "mode": "full" if full_sync else "incremental",
+                "age_seconds": None if age is None else round(age, 1),
+                "fresh": self.is_fresh(table),
+            }
+        return {
+            "path": self.path,
+            "max_staleness": self.max_staleness,
+            "tables": tables,
+            "syncer": self._syncer_file is not None,
+        }
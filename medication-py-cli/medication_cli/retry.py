@@ -0,0 +1,286 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+
+# Default retry settings, overridable through the environment
+RETRY_MAX_ATTEMPTS = int(os.getenv("MEDICATION_RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("MEDICATION_RETRY_BASE_DELAY", "0.1"))  # seconds
+RETRY_MAX_DELAY = float(os.getenv("MEDICATION_RETRY_MAX_DELAY", "2.0"))  # seconds
+DEFAULT_DEADLINE = float(os.getenv("MEDICATION_REQUEST_DEADLINE", "10"))  # seconds
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("MEDICATION_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("MEDICATION_BREAKER_RESET_TIMEOUT", "30"))  # seconds
+
+# PostgREST/PostgreSQL error codes that signal a transient backend problem
+RETRYABLE_API_CODES = {
+    "500", "502", "503", "504", "520",
+    "PGRST000", "PGRST001", "PGRST002",  # PostgREST cannot reach the database
+    "57014",  # statement timeout
+    "40001",  # serialization failure
+    "40P01",  # deadlock detected
+    "53300",  # too many connections
+}
+
+# Monotonic time by which the operation running in this thread or task must finish
+_operation_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar(
+    "medication_operation_deadline", default=None)
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left of the deadline of the operation being executed, or None outside of one"""
+    ends_at = _operation_deadline.get()
+    return None if ends_at is None else ends_at - time.monotonic()
+
+def cap_timeout(request):
+    """httpx request hook shortening the request's timeouts to what is left of the operation's deadline
+
+    Without it one attempt could wait out the full HTTP timeout, far past the budget.
+    """
+    remaining = remaining_budget()
+    timeout = request.extensions.get("timeout")
+    if remaining is None or not timeout:
+        return
+    remaining = max(remaining, 0.001)
+    request.extensions["timeout"] = {kind: remaining if value is None else min(value, remaining)
+                                     for kind, value in timeout.items()}
+
+async def cap_timeout_async(request):
+    """cap_timeout() for httpx.AsyncClient, whose hooks must be coroutines"""
+    cap_timeout(request)
+
+class DeadlineExceeded(TimeoutError):
+    """The operation did not succeed within its deadline budget"""
+
+class CircuitOpenError(RuntimeError):
+    """The backend is considered unhealthy and calls are being rejected"""
+
+class CircuitBreaker:
+    """Fails fast after repeated backend failures until a cool-down has passed
+
+    closed: calls go through. open: calls are rejected until reset_timeout has
+    elapsed. half_open: a single trial call is let through; success closes the
+    breaker again and failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Return whether a call may be attempted right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.trips += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "retry_in": retry_in,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+# Breaker shared by every caller talking to Supabase from this process
+breaker = CircuitBreaker()
+
+def is_retryable(exc: BaseException, idempotent: bool = True) -> bool:
+    """Classify an exception raised by a Supabase call as transient or permanent
+
+    Failures where the request never reached the server (connection errors,
+    connect/pool timeouts) are always safe to retry. Failures after the request
+    was sent (read timeouts, 5xx responses) are only retried for idempotent
+    operations, since a non-idempotent write may already have been applied.
+    """
+    import httpx
+    from postgrest.exceptions import APIError
+
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionRefusedError)):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError,
+                        TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, APIError):
+        return str(exc.code) in RETRYABLE_API_CODES
+    return False
+
+def is_rejection(exc: BaseException) -> bool:
+    """True when the backend answered and refused the request itself, e.g. a constraint violation
+
+    Sending the same request again fails the same way, unlike transport errors
+    and transient backend failures.
+    """
+    from postgrest.exceptions import APIError
+
+    return isinstance(exc, APIError) and str(exc.code) not in RETRYABLE_API_CODES
+
+def backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff for the given (zero-based) retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def _retry_delay(e: Exception, attempt: int, started: float, deadline: Optional[float],
+                 max_attempts: int, idempotent: bool, circuit: Optional[CircuitBreaker]) -> float:
+    """Record a failed attempt and return how long to wait before the next one
+
+    Re-raises e (or DeadlineExceeded) when the operation should not be retried.
+    """
+    retryable = is_retryable(e, idempotent)
+    if circuit is not None:
+        if retryable or is_retryable(e):
+            circuit.record_failure()
+        else:
+            # The backend answered; the request itself was bad
+            circuit.record_success()
+    if not retryable or attempt >= max_attempts:
+        raise e
+
+    delay = backoff_delay(attempt - 1)
+    if deadline is not None and time.monotonic() - started + delay >= deadline:
+        raise DeadlineExceeded("Database query timed out. Please try again.") from e
+    return delay
+
+def _instrumented_retry_delay(e: Exception, attempt: int, started: float, deadline: Optional[float],
+                              max_attempts: int, idempotent: bool, circuit: Optional[CircuitBreaker],
+                              table: str, op: str) -> float:
+    """_retry_delay() that also counts retries and exhausted deadlines"""
+    try:
+        delay = _retry_delay(e, attempt, started, deadline, max_attempts, idempotent, circuit)
+    except DeadlineExceeded:
+        metrics.record_deadline(table, op)
+        raise
+    metrics.record_retry(table, op)
+    return delay
+
+def execute(operation: Callable[[], T], deadline: Optional[float] = DEFAULT_DEADLINE,
+            max_attempts: int = RETRY_MAX_ATTEMPTS, idempotent: bool = True,
+            circuit: Optional[CircuitBreaker] = breaker) -> T:
+    """Run a Supabase operation with retries, a deadline budget and the circuit breaker
+
+    operation is a zero-argument callable, typically a query builder's ``execute``.
+    Transient failures are retried with jittered exponential backoff until
+    max_attempts or the deadline (in seconds, shared by all attempts) runs out;
+    each attempt's HTTP timeouts are capped at what is left of the deadline.
+    Raises CircuitOpenError without calling the backend while the breaker is
+    open, DeadlineExceeded when the budget is spent, and re-raises permanent
+    errors unchanged.
+    """
+    started = time.monotonic()
+    attempt = 0
+    table, op = metrics.describe_operation(operation)
+
+    while True:
+        if circuit is not None and not circuit.allow():
+            raise CircuitOpenError("Database is unavailable. Please try again later.")
+
+        attempt += 1
+        attempt_started = time.perf_counter()
+        token = _operation_deadline.set(None if deadline is None else started + deadline)
+        try:
+            result = operation()
+        except Exception as e:
+            metrics.record_call(table, op, time.perf_counter() - attempt_started, e)
+            time.sleep(_instrumented_retry_delay(e, attempt, started, deadline, max_attempts, idempotent, circuit,
+                                                 table, op))
+            continue
+        finally:
+            _operation_deadline.reset(token)
+
+        metrics.record_call(table, op, time.perf_counter() - attempt_started)
+        if circuit is not None:
+            circuit.record_success()
+        return result
+
+async def execute_async(operation: Callable[[], Awaitable[T]], deadline: Optional[float] = DEFAULT_DEADLINE,
+                        max_attempts: int = RETRY_MAX_ATTEMPTS, idempotent: bool = True,
+                        circuit: Optional[CircuitBreaker] = breaker) -> T:
+    """Async counterpart of execute() for the async Supabase client
+
+    Backoff waits with asyncio.sleep so other requests keep running on the loop.
+    """
+    # Imported here so CLI commands, which never run this, do not pay for asyncio at startup
+    import asyncio
+
+    started = time.monotonic()
+    attempt = 0
+    table, op = metrics.describe_operation(operation)
+
+    while True:
+        if circuit is not None and not circuit.allow():
+            raise CircuitOpenError("Database is unavailable. Please try again later.")
+
+        attempt += 1
+        attempt_started = time.perf_counter()
+        token = _operation_deadline.set(None if deadline is None else started + deadline)
+        try:
+            result = await operation()
+        except Exception as e:
+            metrics.record_call(table, op, time.perf_counter() - attempt_started, e)
+            await asyncio.sleep(_instrumented_retry_delay(e, attempt, started, deadline, max_attempts, idempotent,
+                                                          circuit, table, op))
+            continue
+        finally:
+            _operation_deadline.reset(token)
+
+        metrics.record_call(table, op, time.perf_counter() - attempt_started)
+        if circuit is not None:
+            circuit.record_success()
+        return result
@@ -0,0 +1,382 @@
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .drug_index import FULL_RELOAD_EVERY
+from .retry import execute
+
+# Columns that are matched against search queries, in ranking order
+SEARCH_FIELDS = ("name", "generic_name", "drug_class")
+
+# Minimum trigram similarity for a typo-tolerant match
+FUZZY_THRESHOLD = 0.3
+
+# Number of rows fetched per request while warming the index
+LOAD_PAGE_SIZE = 1000
+
+# PostgREST error code for a column that does not exist
+UNDEFINED_COLUMN = "42703"
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase text and collapse punctuation/whitespace runs into single spaces"""
+    if not text:
+        return ""
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+def trigrams(text: str) -> Set[str]:
+    """Padded trigrams of normalized text (each word is padded like pg_trgm)"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST or=(...) filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _high_water(rows: Iterable[Dict[str, Any]]) -> Optional[Tuple[Any, Any]]:
+    """Largest (updated_at, id) among rows, or None when none has an updated_at"""
+    marks = [(row["updated_at"], row["id"]) for row in rows if row.get("updated_at")]
+    return max(marks) if marks else None
+
+def _inner_trigrams(text: str) -> Set[str]:
+    """Unpadded trigrams of text, which every row containing text as a substring must have"""
+    grams = set()
+    for word in text.split():
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+def _deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+class SearchIndex:
+    """In-memory trigram index over medication names, generic names and drug classes
+
+    Answers ranked substring queries without a database round-trip and falls back
+    to trigram similarity for misspelled queries. Rows are kept whole so results
+    have the same shape as the database response. Writes made through this
+    process update the index right away. Writes made elsewhere are picked up by
+    refresh_if_stale() every refresh_interval seconds: a refresh reads only rows
+    whose updated_at is past the newest one indexed, and every FULL_RELOAD_EVERY
+    refreshes the whole table is reloaded to drop rows deleted elsewhere.
+    """
+
+    def __init__(self, table: str = "medications", refresh_interval: float = 300):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._fields: Dict[str, Tuple[str, ...]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._warm = False
+        self._loading = False
+        self._refreshing = False
+        self._loaded_at: Optional[float] = None
+        # Newest (updated_at, id) read from the table; refreshes read only rows past it
+        self._high_water: Optional[Tuple[Any, Any]] = None
+        self._refreshes = 0
+        # Cleared when the table has no updated_at column; every refresh is then a full load
+        self._incremental = True
+        # Writes made while the table is being read, re-applied once the read finishes
+        self._pending: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+
+    @property
+    def is_warm(self) -> bool:
+        return self._warm
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def load(self, client=None):
+        """(Re)build the index from every row of the table"""
+        if client is None:
+            from .supabase_client import supabase as client
+
+        rows = self._read(lambda: self._fetch_all(client))
+        with self._lock:
+            self._rows.clear()
+            self._fields.clear()
+            self._postings.clear()
+            self._high_water = None
+            self._apply(rows)
+            self._warm = True
+
+    def refresh(self, client=None) -> Dict[str, int]:
+        """Bring the index up to date with writes made elsewhere
+
+        Reads only the rows changed since the newest one indexed. Every
+        FULL_RELOAD_EVERY-th refresh is a full load(), which also drops rows
+        deleted elsewhere; so is every refresh of a table without updated_at.
+        """
+        from postgrest.exceptions import APIError
+
+        if client is None:
+            from .supabase_client import supabase as client
+
+        self._refreshes += 1
+        if self._incremental and self._refreshes % FULL_RELOAD_EVERY:
+            try:
+                rows = self._read(lambda: self._fetch_changed(client))
+            except APIError as e:
+                if e.code != UNDEFINED_COLUMN:
+                    raise
+                print(f"Warning: {self.table} has no updated_at column; the search index reloads it in full instead")
+                self._incremental = False
+            else:
+                with self._lock:
+                    self._apply(rows)
+                return {"changed": len(rows)}
+
+        self.load(client)
+        return {"changed": 0, "reloaded": len(self)}
+
+    def _fetch_all(self, client) -> List[Dict[str, Any]]:
+        rows = []
+        start = 0
+        while True:
+            query = client.table(self.table).select("*").order("id").range(start, start + LOAD_PAGE_SIZE - 1)
+            page = execute(query.execute).data or []
+            rows.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                return rows
+            start += LOAD_PAGE_SIZE
+
+    def _fetch_changed(self, client) -> List[Dict[str, Any]]:
+        """Rows past the high-water mark, paged in (updated_at, id) order"""
+        rows = []
+        high_water = self._high_water
+        while True:
+            builder = client.table(self.table).select("*")
+            if high_water is not None:
+                updated_at, row_id = high_water
+                builder = builder.or_(f"updated_at.gt.{_quote(updated_at)},"
+                                      f"and(updated_at.eq.{_quote(updated_at)},id.gt.{_quote(row_id)})")
+            page = execute(builder.order("updated_at").order("id").limit(LOAD_PAGE_SIZE).execute).data or []
+            rows.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                return rows
+            high_water = (page[-1].get("updated_at"), page[-1]["id"])
+
+    def _read(self, fetch: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Rows returned by fetch(), recording writes made meanwhile for _apply()"""
+        with self._lock:
+            self._pending = {}
+        try:
+            return fetch()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+    def _apply(self, rows: List[Dict[str, Any]]):
+        """Index rows read from the table, then re-apply writes made while they were read"""
+        pending, self._pending = self._pending or {}, None
+        for row in rows:
+            self._remove(str(row["id"]))
+            self._add(row)
+        for row_id, row in pending.items():
+            self._remove(row_id)
+            if row is not None:
+                self._add(row)
+        mark = _high_water(rows)
+        if mark is not None and (self._high_water is None or mark > self._high_water):
+            self._high_water = mark
+        self._loaded_at = time.monotonic()
+
+    def warm_in_background(self, client=None) -> threading.Thread:
+        """Load the index on a daemon thread; searches fall back to the database until it is warm"""
+        def run():
+            try:
+                self.load(client)
+            except Exception as e:
+                print(f"Warning: Could not build search index: {e}")
+            finally:
+                self._loading = False
+
+        self._loading = True
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_if_stale(self, client=None) -> Optional[threading.Thread]:
+        """refresh() on a daemon thread once refresh_interval has passed since the last one"""
+        with self._lock:
+            if not self._warm or self._refreshing or self._loading or self.refresh_interval <= 0:
+                return None
+            if time.monotonic() - self._loaded_at < self.refresh_interval:
+                return None
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(client)
+            except Exception as e:
+                print(f"Warning: Could not refresh search index: {e}")
+            finally:
+                self._refreshing = False
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, row_id: Any) -> Optional[Dict[str, Any]]:
+        """Indexed row by id, or None"""
+        return self._rows.get(str(row_id))
+
+    def upsert(self, row: Dict[str, Any]):
+        """Add or replace a single row after it was written to the database"""
+        if not row or row.get("id") is None:
+            return
+        with self._lock:
+            self._remove(str(row["id"]))
+            self._add(row)
+            if self._pending is not None:
+                self._pending[str(row["id"])] = row
+
+    def update(self, row_id: Any, changes: Dict[str, Any]):
+        """Apply a partial update to an indexed row"""
+        with self._lock:
+            existing = self._rows.get(str(row_id))
+            if existing is not None:
+                self.upsert({**existing, **changes})
+
+    def remove(self, row_id: Any):
+        """Drop a row after it was deleted from the database"""
+        with self._lock:
+            self._remove(str(row_id))
+            if self._pending is not None:
+                self._pending[str(row_id)] = None
+
+    def _add(self, row: Dict[str, Any]):
+        row_id = str(row["id"])
+        fields = tuple(normalize(row.get(field)) for field in SEARCH_FIELDS)
+        self._rows[row_id] = row
+        self._fields[row_id] = fields
+        for gram in trigrams(" ".join(fields)) | _inner_trigrams(" ".join(fields)):
+            self._postings.setdefault(gram, set()).add(row_id)
+
+    def _remove(self, row_id: str):
+        fields = self._fields.pop(row_id, None)
+        self._rows.pop(row_id, None)
+        if fields is None:
+            return
+        for gram in trigrams(" ".join(fields)) | _inner_trigrams(" ".join(fields)):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _substring_rank(self, row_id: str, query: str) -> Optional[Tuple[int, int]]:
+        """Rank of a substring hit (lower is better), or None when the row does not contain query"""
+        for position, field in enumerate(self._fields[row_id]):
+            if field == query:
+                return (position * 4, len(field))
+            if field.startswith(query):
+                return (position * 4 + 1, len(field))
+            if f" {query}" in f" {field}":
+                return (position * 4 + 2, len(field))
+            if query in field:
+                return (position * 4 + 3, len(field))
+        return None
+
+    def _candidates(self, grams: Iterable[str]) -> Optional[Set[str]]:
+        sets = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        if not sets:
+            return None
+        result = set(sets[0])
+        for ids in sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """Return up to limit rows ranked by match quality
+
+        Exact and prefix matches on the name rank first, then word-prefix and plain
+        substring matches, then matches on generic name and drug class. When there
+        are not enough substring hits the remainder is filled with rows whose names
+        are similar by trigram overlap, which tolerates typos.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        with self._lock:
+            grams = _inner_trigrams(query)
+            candidates = self._candidates(grams) if grams else None
+            if candidates is None:
+                # Too short for trigrams; every row is a candidate
+                candidates = self._rows.keys()
+
+            hits = []
+            for row_id in candidates:
+                rank = self._substring_rank(row_id, query)
+                if rank is not None:
+                    hits.append((rank, self._fields[row_id][0], row_id))
+            hits.sort()
+            results = [self._rows[row_id] for _, _, row_id in hits[:limit]]
+
+            if fuzzy and len(results) < limit:
+                query_grams = trigrams(query)
+                counts: Dict[str, int] = {}
+                for gram in query_grams:
+                    for row_id in self._postings.get(gram, ()):
+                        counts[row_id] = counts.get(row_id, 0) + 1
+
+                seen = {row_id for _, _, row_id in hits}
+                similar = []
+                for row_id, shared in counts.items():
+                    if row_id in seen:
+                        continue
+                    best = 0.0
+                    for field in self._fields[row_id]:
+                        field_grams = trigrams(field)
+                        if field_grams:
+                            overlap = len(query_grams & field_grams)
+                            best = max(best, overlap / len(query_grams | field_grams))
+                    if best >= FUZZY_THRESHOLD:
+                        similar.append((-best, self._fields[row_id][0], row_id))
+                similar.sort()
+                results.extend(self._rows[row_id] for _, _, row_id in similar[:limit - len(results)])
+
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and approximate memory footprint of the index"""
+        with self._lock:
+            seen: Set[int] = set()
+            rows_bytes = _deep_sizeof(self._rows, seen)
+            index_bytes = _deep_sizeof(self._fields, seen) + _deep_sizeof(self._postings, seen)
+            return {
+                "table": self.table,
+                "warm": self._warm,
+                "loading": self._loading,
+                "refreshing": self._refreshing,
+                "age_seconds": None if self._loaded_at is None else round(time.monotonic() - self._loaded_at, 1),
+                "refresh_interval": self.refresh_interval,
+                "documents": len(self._rows),
+                "trigrams": len(self._postings),
+                "rows_bytes": rows_bytes,
+                "index_bytes": index_bytes,
+                "memory_bytes": rows_bytes + index_bytes,
+            }
+
+# Shared index used by the API and CLI; refreshed in the background after this many seconds
+search_index = SearchIndex(refresh_interval=float(os.getenv("MEDICATION_SEARCH_INDEX_REFRESH", "300")))
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+
+from . import api as flask_api
+from . import metrics
+from .supabase_client import reset_client
+
+# Production server defaults
+DEFAULT_THREADS = 4
+DEFAULT_TIMEOUT = 30  # seconds a worker may spend on a request before it is restarted
+DEFAULT_KEEP_ALIVE = 5  # seconds an idle keep-alive connection is held open
+DEFAULT_GRACEFUL_TIMEOUT = 30  # seconds workers get to finish requests on restart/shutdown
+
+def default_workers() -> int:
+    """Number of worker processes to use when none is given: one per core"""
+    return multiprocessing.cpu_count()
+
+def pre_fork(server, worker):
+    """Give the worker about to be forked the lowest slot number no live worker holds
+
+    A replacement worker reuses the slot of the one it replaces, so per-worker
+    metric series stay bounded however often workers restart.
+    """
+    taken = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+def post_fork(server, worker):
+    """Give every worker its own Supabase client instead of the parent's sockets"""
+    reset_client()
+    # Metrics are per worker and /metrics is answered by whichever worker gets the scrape
+    metrics.registry.label_process(worker=worker.slot)
+    if flask_api.replica is not None:
+        flask_api.replica.reset()
+
+def post_worker_init(worker):
+    """Per-worker startup once the application has been loaded"""
+    if flask_api.SEARCH_ENGINE == 'index':
+        # Background threads do not survive fork, so each worker warms its own index
+        flask_api.search_index.warm_in_background()
+    if flask_api.replica is not None:
+        # Every worker runs the loop, but only the one holding the replica's lock file syncs
+        flask_api.replica.start_background_sync()
+
+class ProductionServer(BaseApplication):
+    """Pre-forking gunicorn server for the Flask medication API
+
+    Workers are forked from a master that has already imported the app, so code
+    is shared copy-on-write. SIGHUP to the master restarts the workers
+    gracefully (new ones start, old ones finish their in-flight requests first),
+    but they are forked from the same preloaded app: new code needs a restart.
+    """
+
+    def __init__(self, application, options: Dict[str, Any]):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+def start_production_api(host='0.0.0.0', port=5000, debug=False, search_engine=None,
+                         workers=None, threads=DEFAULT_THREADS, timeout=DEFAULT_TIMEOUT,
+                         keep_alive=DEFAULT_KEEP_ALIVE, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT,
+                         use_local_replica=False):
+    """Serve the Flask API with pre-forked gunicorn workers"""
+    if search_engine:
+        flask_api.SEARCH_ENGINE = search_engine
+    if use_local_replica or os.getenv("MEDICATION_REPLICA") == "1":
+        # One worker at a time syncs the shared replica file, from post_worker_init
+        flask_api.enable_replica(start_sync=False)
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers or default_workers(),
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "timeout": timeout,
+        "keepalive": keep_alive,
+        "graceful_timeout": graceful_timeout,
+        "preload_app": True,
+        "pre_fork": pre_fork,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "loglevel": "debug" if debug else "info",
+        "proc_name": "medication-api",
+    }
+    ProductionServer(flask_api.app, options).run()
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class _Call:
+    """An in-flight call whose result is shared with every caller of the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Coalesces identical concurrent calls so only the first one does the work
+
+    Callers that arrive with the same key while a call is running wait for it and
+    get its result (or its exception) instead of making their own. Nothing is
+    kept once the call finishes; caching results is left to the response cache.
+    do() serves threaded servers and do_async() the event loop of the ASGI app.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, "asyncio.Future"] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def _count(self, shared: bool):
+        with self._lock:
+            if shared:
+                self.shared += 1
+            else:
+                self.calls += 1
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+
+        future = self._futures.get(key)
+        if future is not None:
+            self._count(True)
+            # Shielded so a caller that goes away does not cancel the shared call
+            return await asyncio.shield(future)
+
+        self._count(False)
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def forget(self, predicate: Callable[[Hashable], bool]):
+        """Let later callers of matching keys start a new call instead of joining a running one
+
+        Used after writes, so nobody is handed a result read before the write.
+        """
+        with self._lock:
+            for key in [key for key in self._calls if predicate(key)]:
+                del self._calls[key]
+        for key in [key for key in self._futures if predicate(key)]:
+            del self._futures[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.calls + self.shared
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._calls) + len(self._futures),
+                "backend_calls": self.calls,
+                "saved_calls": self.shared,
+                "saved_rate": self.shared / requests if requests else 0.0,
+            }
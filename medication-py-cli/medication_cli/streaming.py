@@ -0,0 +1,199 @@
+import codecs
+import json
+import os
+from typing import Any, BinaryIO, Iterator, NamedTuple, Optional
+
+# Number of bytes read from the file per chunk
+CHUNK_SIZE = 64 * 1024
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+class StreamRecord(NamedTuple):
+    """One top-level record read from an import file
+
+    offset is the byte offset just past the record, i.e. where a resumed run
+    should continue reading from.
+    """
+    index: int
+    offset: int
+    data: Any
+    error: Optional[str] = None
+
+class _TextBuffer:
+    """Decoded text window over a binary file that tracks byte offsets"""
+
+    def __init__(self, f: BinaryIO, offset: int):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.offset = offset  # byte offset of self.text[0]
+        self.eof = False
+
+    def fill(self, size: int = CHUNK_SIZE) -> bool:
+        """Read more of the file into the window, returning False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            self.text += self.decoder.decode(b'', final=True)
+            return False
+        self.text += self.decoder.decode(chunk)
+        return True
+
+    def skip_whitespace(self) -> Optional[str]:
+        """Advance past whitespace and return the next character, or None at end of file"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return None
+
+    def consume(self, end: int):
+        """Drop everything before end from the window so memory stays flat"""
+        self.offset += len(self.text[:end].encode('utf-8'))
+        self.text = self.text[end:]
+        self.pos = 0
+
+def _sniff(f: BinaryIO) -> Optional[str]:
+    """Format of a JSON file from its start: 'array', 'object', 'ndjson' or None if it is neither
+
+    A file whose first line is a complete JSON object is read as NDJSON, whatever
+    its extension; a single object written on one line reads the same either way.
+    """
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return None
+        stripped = chunk.lstrip()
+        if stripped:
+            break
+    if stripped.startswith(b'['):
+        return 'array'
+    if not stripped.startswith(b'{'):
+        return None
+
+    line = stripped if b'\n' in stripped else stripped + f.readline()
+    try:
+        json.loads(line.split(b'\n', 1)[0])
+    except ValueError:
+        return 'object'
+    return 'ndjson'
+
+def _iter_object(f: BinaryIO, offset: int, index: int) -> Iterator[StreamRecord]:
+    """Yield the one drug object a file holds, rejecting anything after it"""
+    if offset:
+        yield StreamRecord(index, offset, None, "Cannot resume inside a single JSON object")
+        return
+
+    buf = _TextBuffer(f, 0)
+    while buf.fill():
+        pass
+    try:
+        data, end = json.JSONDecoder().raw_decode(buf.text, len(buf.text) - len(buf.text.lstrip()))
+    except ValueError as e:
+        yield StreamRecord(index, 0, None, f"Invalid JSON: {e}")
+        return
+    buf.pos = end
+    if buf.skip_whitespace() is not None:
+        yield StreamRecord(index, 0, None, f"Invalid JSON: extra data after the object at character {end}")
+        return
+    yield StreamRecord(index, len(buf.text.encode('utf-8')), data)
+
+def _iter_array(f: BinaryIO, offset: int, index: int) -> Iterator[StreamRecord]:
+    """Yield the elements of a JSON array; a non-zero offset is just past an element"""
+    decoder = json.JSONDecoder()
+    buf = _TextBuffer(f, offset)
+
+    # After '[' or ',' an element must follow; after an element, ',' or ']'
+    after_element = offset > 0
+    empty = not after_element
+    if empty:
+        buf.skip_whitespace()
+        buf.consume(buf.pos + 1)
+
+    while True:
+        char = buf.skip_whitespace()
+        if char is None:
+            yield StreamRecord(index, buf.offset, None, "Invalid JSON: unexpected end of file")
+            return
+        if after_element:
+            if char == ']':
+                return
+            if char != ',':
+                yield StreamRecord(index, buf.offset, None, f"Invalid JSON: expected ',' or ']' but found {char!r}")
+                return
+            buf.pos += 1
+            after_element = False
+            continue
+        if char == ']' and empty:
+            return
+
+        # Decode the next element, reading more of the file until it is complete
+        read_size = CHUNK_SIZE
+        while True:
+            try:
+                data, end = decoder.raw_decode(buf.text, buf.pos)
+                # A number at the very end of the window may have been cut short
+                if end < len(buf.text) or buf.eof:
+                    break
+            except ValueError as e:
+                if buf.eof:
+                    yield StreamRecord(index, buf.offset, None, f"Invalid JSON: {e}")
+                    return
+            buf.fill(read_size)
+            read_size *= 2
+
+        buf.consume(end)
+        yield StreamRecord(index, buf.offset, data)
+        index += 1
+        after_element = True
+        empty = False
+
+def _iter_ndjson(f: BinaryIO, offset: int, index: int) -> Iterator[StreamRecord]:
+    for line in f:
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            yield StreamRecord(index, offset, json.loads(line))
+        except ValueError as e:
+            yield StreamRecord(index, offset, None, f"Invalid JSON: {e}")
+        index += 1
+
+def iter_json_records(path: str, start_offset: int = 0, start_index: int = 0) -> Iterator[StreamRecord]:
+    """Stream the top-level records of a JSON array, single JSON object or NDJSON file
+
+    .json files holding one object per line are read as NDJSON too. Records are parsed one at a time so memory use does not grow with the file
+    size. A run can be resumed from the offset of the last record it finished
+    (start_offset, with start_index set to that record's index + 1), or by
+    skipping the first start_index records when only the count is known.
+    """
+    with open(path, 'rb') as f:
+        index = 0
+        if start_offset:
+            size = os.fstat(f.fileno()).st_size
+            if start_offset > size:
+                raise ValueError(f"Offset {start_offset} is past the end of {path}")
+            if start_offset == size:
+                # A finished run: nothing is left to read
+                return
+            index = start_index
+
+        file_format = 'ndjson' if path.lower().endswith(NDJSON_EXTENSIONS) else _sniff(f)
+        f.seek(start_offset)
+        if file_format == 'ndjson':
+            records = _iter_ndjson(f, start_offset, index)
+        elif file_format == 'object':
+            records = _iter_object(f, start_offset, index)
+        elif file_format == 'array':
+            records = _iter_array(f, start_offset, index)
+        else:
+            records = iter([StreamRecord(index, start_offset, None, "Invalid JSON: expected an object or an array")])
+        for record in records:
+            if record.index < start_index:
+                continue
+            yield record
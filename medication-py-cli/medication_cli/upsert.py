@@ -0,0 +1,193 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .drug_index import fetch_rows
+from .export import CHILD_TABLES, import_format_to_rows
+from .retry import execute
+from .supabase_client import supabase
+
+# Outcomes of upserting one drug record
+CREATED, UPDATED, UNCHANGED = "created", "updated", "unchanged"
+
+def _row_key(table: str, row: Dict[str, Any]) -> Tuple:
+    return tuple(row.get(column) for column in CHILD_TABLES[table])
+
+def content_hash(drug_data: Dict[str, Any]) -> str:
+    """SHA-256 of everything an import writes for a drug
+
+    Child rows are compared as multisets, so reordering them in the source file
+    does not count as a change.
+    """
+    base_fields, children = import_format_to_rows(drug_data)
+    canonical = {
+        "drug": base_fields,
+        "children": {table: sorted(json.dumps(_row_key(table, row), default=str) for row in rows)
+                     for table, rows in children.items()},
+    }
+    body = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(body).hexdigest()
+
+def diff_rows(table: str, current: List[Dict[str, Any]],
+              desired: List[Dict[str, Any]]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """(ids of current rows to delete, desired rows to insert) turning current into desired
+
+    Rows are compared on the columns the import writes; duplicates are matched
+    one for one, so two identical rows in the source stay two rows.
+    """
+    wanted = Counter(_row_key(table, row) for row in desired)
+    deletes = []
+    for row in current:
+        key = _row_key(table, row)
+        if wanted[key] > 0:
+            wanted[key] -= 1
+        else:
+            deletes.append(row["id"])
+
+    inserts = []
+    for row in desired:
+        key = _row_key(table, row)
+        if wanted[key] > 0:
+            wanted[key] -= 1
+            inserts.append(row)
+    return deletes, inserts
+
+class IncompleteImport(RuntimeError):
+    """Some child rows of a drug could not be written; its content hash was not stored"""
+
+    def __init__(self, drug_id: Any, missing: Dict[str, int]):
+        self.drug_id = drug_id
+        self.missing = missing
+        details = ", ".join(f"{count} {table}" for table, count in missing.items())
+        super().__init__(f"Drug {drug_id} is incomplete ({details} rows not written); it will be retried next run")
+
+class DrugUpserter:
+    """Imports drug records keyed by slug, writing only what changed since the last import
+
+    The slug, id and content hash of every drug are read once up front, so a
+    record whose hash is unchanged costs no requests at all. A changed record
+    gets its drugs row updated and, per child table, only the rows that were
+    added or removed are inserted or deleted. The hash is written last and only
+    when every child row was written, so a failed or interrupted import is
+    retried on the next run. Upserts of the same slug run one at a time, so
+    concurrent records for one drug never both insert it.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._known: Optional[Dict[str, Tuple[Any, Optional[str]]]] = None
+        # slug -> [lock, number of upserts holding or waiting for it]
+        self._slug_locks: Dict[str, List[Any]] = {}
+
+    def preload(self):
+        """Read the slug, id and content hash of every drug"""
+        rows = fetch_rows(supabase, "drugs", ("id", "slug", "content_hash"))
+        with self._lock:
+            self._known = {row["slug"]: (row["id"], row.get("content_hash")) for row in rows if row.get("slug")}
+
+    def _existing(self, slug: str) -> Optional[Tuple[Any, Optional[str]]]:
+        with self._lock:
+            if self._known is not None:
+                return self._known.get(slug)
+        query = supabase.table("drugs").select("id, content_hash").eq("slug", slug).limit(1)
+        rows = execute(query.execute).data or []
+        return (rows[0]["id"], rows[0].get("content_hash")) if rows else None
+
+    def _remember(self, slug: str, drug_id: Any, digest: Optional[str]):
+        with self._lock:
+            if self._known is not None:
+                self._known[slug] = (drug_id, digest)
+
+    @contextmanager
+    def _claim(self, slug: str) -> Iterator[None]:
+        """Hold the lock of one slug; it is dropped once nobody holds or waits for it"""
+        with self._lock:
+            entry = self._slug_locks.setdefault(slug, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._slug_locks[slug]
+
+    def _current_children(self, drug_id: Any) -> Dict[str, List[Dict[str, Any]]]:
+        """Child rows of a drug with their ids, one query per child table"""
+        children = {}
+        for table, columns in CHILD_TABLES.items():
+            query = supabase.table(table).select(", ".join(("id",) + columns)).eq("drug_id", drug_id)
+            children[table] = execute(query.execute).data or []
+        return children
+
+    def _store_hash(self, slug: str, drug_id: Any, digest: str, extra: Optional[Dict[str, Any]] = None):
+        response = execute(supabase.table("drugs").update({**(extra or {}), "content_hash": digest})
+                           .eq("id", drug_id).execute)
+        self._remember(slug, drug_id, digest)
+        return response
+
+    def upsert(self, drug_data: Dict[str, Any], warn: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Create, update or skip one drug record, returning what was done
+
+        Raises IncompleteImport when some child rows could not be written; the
+        content hash is then left unset so the next upsert retries the drug.
+        Warnings about rejected rows go to warn, as in insert_rows().
+        """
+        slug = drug_data.get("slug")
+        if not slug:
+            raise ValueError("Drug record needs a slug to be upserted")
+        with self._claim(slug):
+            return self._upsert(slug, drug_data, warn)
+
+    def _upsert(self, slug: str, drug_data: Dict[str, Any], warn: Optional[Callable[[str], None]]) -> Dict[str, Any]:
+        from .cli import DEFAULT_BATCH_SIZE, insert_drug, insert_child_rows, update_drug_indexes
+
+        batch_size = self.batch_size or DEFAULT_BATCH_SIZE
+        digest = content_hash(drug_data)
+        existing = self._existing(slug)
+        if existing is not None and existing[1] == digest:
+            return {"id": existing[0], "status": UNCHANGED, "inserted": 0, "deleted": 0}
+
+        base_fields, children = import_format_to_rows(drug_data)
+        if existing is None:
+            # The hash is stored only once every child row is in place
+            drug, written = insert_drug(base_fields, children, batch_size, warn)
+            if drug is None:
+                raise RuntimeError("Failed to insert drug")
+            self._remember(slug, drug["id"], None)
+            missing = {table: len(rows) - written[table] for table, rows in children.items() if written[table] < len(rows)}
+            if missing:
+                raise IncompleteImport(drug["id"], missing)
+            self._store_hash(slug, drug["id"], digest)
+            return {"id": drug["id"], "status": CREATED, "inserted": sum(written.values()), "deleted": 0}
+
+        drug_id = existing[0]
+        current = self._current_children(drug_id)
+        inserted = deleted = 0
+        missing = {}
+        for table, rows in children.items():
+            deletes, inserts = diff_rows(table, current.get(table, []), rows)
+            if deletes:
+                execute(supabase.table(table).delete().in_("id", deletes).execute)
+                deleted += len(deletes)
+            if inserts:
+                written = insert_child_rows(table, drug_id, inserts, batch_size, warn)
+                inserted += written
+                if written < len(inserts):
+                    missing[table] = len(inserts) - written
+
+        if missing:
+            # Clear the hash, so the drug is diffed again even if the source goes back to its old content
+            execute(supabase.table("drugs").update({**base_fields, "content_hash": None}).eq("id", drug_id).execute)
+            self._remember(slug, drug_id, None)
+            raise IncompleteImport(drug_id, missing)
+
+        response = self._store_hash(slug, drug_id, digest, base_fields)
+        if response.data:
+            update_drug_indexes(response.data[0], children)
+        return {"id": drug_id, "status": UPDATED, "inserted": inserted, "deleted": deleted}
@@ -8,9 +8,13 @@ setup(
     include_package_data=True,
     install_requires=[
         "click>=8.0.0",
-        "supabase>=1.0.3",
+        "supabase>=2.16.0",
         "python-dotenv>=1.0.0",
     ],
+    extras_require={
+        "async": ["uvicorn>=0.20.0"],
+        "production": ["gunicorn>=20.1.0"],
+    },
     entry_points="""
         [console_scripts]
         medication-cli=medication_cli.cli:cli
@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+import pytest
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_ROOT)
+sys.path.insert(0, os.path.join(PACKAGE_ROOT, "benchmarks"))
+
+from fake_postgrest import FakePostgrest  # noqa: E402
+
+# Started at collection time: medication_cli reads SUPABASE_URL when it is imported
+_server = FakePostgrest().start()
+os.environ["SUPABASE_URL"] = _server.url
+
+@pytest.fixture
+def fake_postgrest():
+    """The in-memory PostgREST stand-in, emptied before each test"""
+    _server.reset()
+    yield _server
+    _server.reset()
+
+@pytest.fixture
+def fail_inserts(fake_postgrest, monkeypatch):
+    """Call with a table name to make every insert into that table fail with a 400"""
+    insert = fake_postgrest.insert
+    failing = set()
+
+    def flaky_insert(table, rows, params, prefer):
+        if table in failing:
+            raise RuntimeError(f"insert into {table} rejected")
+        return insert(table, rows, params, prefer)
+
+    monkeypatch.setattr(fake_postgrest, "insert", flaky_insert)
+    return failing.add
+
+@pytest.fixture
+def example_drug():
+    with open(os.path.join(PACKAGE_ROOT, "example_drug.json")) as f:
+        return json.load(f)
@@ -0,0 +1,41 @@
+from postgrest.exceptions import APIError
+
+from medication_cli.api import app, error_response
+
+def test_unknown_column_is_a_bad_request():
+    error = APIError({"code": "42703", "message": "column medications.unknown_column does not exist",
+                      "hint": None, "details": None})
+    assert error_response(error) == ({"error": "column medications.unknown_column does not exist"}, 400)
+
+def test_backend_failure_is_not_a_bad_request():
+    error = APIError({"code": "XX000", "message": "internal error", "hint": None, "details": None})
+    assert error_response(error)[1] == 500
+
+def test_list_with_unknown_field_returns_400(fake_postgrest, monkeypatch):
+    select = fake_postgrest.select
+
+    class UndefinedColumn(ValueError):
+        code = "42703"
+
+    def strict_select(table, params):
+        if "unknown_column" in dict(params).get("select", ""):
+            raise UndefinedColumn("column medications.unknown_column does not exist")
+        return select(table, params)
+
+    monkeypatch.setattr(fake_postgrest, "select", strict_select)
+    response = app.test_client().get("/medications?fields=unknown_column")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "column medications.unknown_column does not exist"}
+
+def test_single_update_refreshes_indexes_and_cached_detail(fake_postgrest):
+    from medication_cli.aliases import alias_index
+    from medication_cli.api import response_cache
+
+    fake_postgrest.tables["medications"] = [{"id": "1", "name": "Aspirin"}]
+    response_cache.clear()
+    client = app.test_client()
+    assert client.get("/medications/1").get_json()["name"] == "Aspirin"
+
+    assert client.put("/medications/1", json={"name": "Bayer"}).status_code == 200
+    assert client.get("/medications/1").get_json()["name"] == "Bayer"
+    assert alias_index.medication_id("Bayer") == "1"
@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+import pytest
+
+from medication_cli import api
+from medication_cli.asgi import asgi_app
+
+@pytest.fixture
+def medications(fake_postgrest):
+    fake_postgrest.tables["medications"] = [{"id": str(i), "name": f"Medication {i}"} for i in range(1, 4)]
+    api.response_cache.clear()
+    return fake_postgrest.tables["medications"]
+
+def _put(body):
+    response = api.app.test_client().put("/medications/batch", json=body)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_duplicate_ids_are_rejected(medications):
+    body = _put([{"id": "1", "drug_class": "NSAID"}, {"id": "2", "drug_class": "NSAID"},
+                 {"id": "1", "drug_class": "Opioid"}])
+    assert [(result["index"], result["status"]) for result in body["results"]] == [(0, 400), (1, 200), (2, 400)]
+    assert medications[0].get("drug_class") is None
+    assert medications[1]["drug_class"] == "NSAID"
+
+def test_rejected_insert_is_retried_per_item(fake_postgrest, medications, monkeypatch):
+    insert = fake_postgrest.insert
+
+    def reject_bad_names(table, rows, params, prefer):
+        if any(row["name"] == "Bad" for row in rows):
+            raise ValueError("new row violates check constraint")
+        return insert(table, rows, params, prefer)
+
+    monkeypatch.setattr(fake_postgrest, "insert", reject_bad_names)
+    response = api.app.test_client().post("/medications/batch", json=[{"name": "Good"}, {"name": "Bad"}])
+    assert [result["status"] for result in response.get_json()["results"]] == [201, 400]
+
+def test_failed_insert_is_not_retried_per_item(fake_postgrest, medications, monkeypatch):
+    monkeypatch.setattr(fake_postgrest, "error_rate", 1.0)
+    response = api.app.test_client().post("/medications/batch", json=[{"name": "A"}, {"name": "B"}])
+    assert response.status_code == 504
+    # Inserts are not idempotent, so a 503 is not retried and no per-item inserts follow
+    assert fake_postgrest.requests == 1
+
+def test_async_batch_update_matches_flask(medications):
+    async def put():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.put("/medications/batch", json=[{"id": "1", "name": "A"}, {"id": "1", "name": "B"},
+                                                                  {"id": "3", "name": "C"}])).json()
+
+    body = asyncio.run(put())
+    assert [(result["index"], result["status"]) for result in body["results"]] == [(0, 400), (1, 400), (2, 200)]
+    assert medications[2]["name"] == "C"
+
+def test_rows_missing_from_the_insert_response_are_reported(fake_postgrest, medications, monkeypatch):
+    insert = fake_postgrest.insert
+
+    def hide_secret_rows(table, rows, params, prefer):
+        return [row for row in insert(table, rows, params, prefer) if row["name"] != "Secret"]
+
+    monkeypatch.setattr(fake_postgrest, "insert", hide_secret_rows)
+    body = api.app.test_client().post("/medications/batch",
+                                      json=[{"name": "Secret"}, {"name": "Public"}]).get_json()
+    assert [(result["index"], result["status"]) for result in body["results"]] == [(0, 500), (1, 201)]
+    assert body["results"][1]["message"] == "Successfully added Public"
+    assert body["failed"] == 1
+
+def test_per_item_insert_with_no_returned_row_is_a_failed_item(fake_postgrest, medications, monkeypatch):
+    insert = fake_postgrest.insert
+
+    def reject_batches(table, rows, params, prefer):
+        if len(rows) > 1:
+            raise ValueError("new row violates check constraint")
+        return [] if rows[0]["name"] == "Secret" else insert(table, rows, params, prefer)
+
+    monkeypatch.setattr(fake_postgrest, "insert", reject_batches)
+    response = api.app.test_client().post("/medications/batch", json=[{"name": "Secret"}, {"name": "Public"}])
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == [500, 201]
@@ -0,0 +1,31 @@
+import json
+
+from medication_cli.bulk import run_bulk_import
+from medication_cli.export import import_format_to_rows
+
+def test_rejected_child_rows_are_recorded_as_failures(fake_postgrest, fail_inserts, example_drug, tmp_path, capsys):
+    source = tmp_path / "drugs.ndjson"
+    source.write_text(json.dumps(example_drug) + "\n")
+    fail_inserts("drug_imprints")
+
+    stats = run_bulk_import([str(source)], workers=1)
+
+    children = import_format_to_rows(example_drug)[1]
+    written = sum(len(rows) for table, rows in children.items() if table != "drug_imprints")
+    assert stats.drugs == 1 and stats.failed == 1
+    assert stats.rows == 1 + written
+    [(label, reason)] = stats.failures
+    assert label == f"{source}[0]"
+    assert f"{len(children['drug_imprints'])} child rows not written" in reason
+    assert "Warning" not in capsys.readouterr().out
+
+def test_upserts_of_one_slug_never_insert_it_twice(fake_postgrest, example_drug, tmp_path, monkeypatch):
+    source = tmp_path / "drugs.ndjson"
+    renamed = dict(example_drug, name=example_drug["name"] + " XR")
+    source.write_text("".join(json.dumps(record) + "\n" for record in [example_drug, renamed] * 3))
+    monkeypatch.setattr(fake_postgrest, "latency_ms", 5)
+
+    stats = run_bulk_import([str(source)], workers=6, upsert=True)
+
+    assert stats.failed == 0
+    assert len(fake_postgrest.tables["drugs"]) == 1
@@ -0,0 +1,12 @@
+from medication_cli.cache import TTLCache
+
+def test_read_started_before_an_invalidation_is_not_stored():
+    cache = TTLCache()
+    generation = cache.generation
+    cache.invalidate(("detail", "1"))
+    cache.set(("detail", "1"), {"name": "old"}, generation=generation)
+    assert cache.get(("detail", "1")) is None
+    assert cache.stats()["stale_skips"] == 1
+
+    cache.set(("detail", "1"), {"name": "new"}, generation=cache.generation)
+    assert cache.get(("detail", "1")) == {"name": "new"}
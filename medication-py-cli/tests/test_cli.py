@@ -0,0 +1,33 @@
+import json
+
+from click.testing import CliRunner
+
+from medication_cli.cli import cli
+
+def _dump(tmp_path, names, file_name="drugs.ndjson"):
+    path = tmp_path / file_name
+    path.write_text("".join(json.dumps({"name": name, "slug": name.lower()}) + "\n" for name in names))
+    return str(path)
+
+def test_checkpoint_of_another_file_is_not_resumed(fake_postgrest, tmp_path):
+    checkpoint = str(tmp_path / "import.ckpt")
+    first = _dump(tmp_path, ["Aspirin", "Ibuprofen"], "first.ndjson")
+    assert CliRunner().invoke(cli, ["import", first, "--checkpoint", checkpoint]).exit_code == 0
+
+    second = _dump(tmp_path, ["Naproxen"], "second.ndjson")
+    result = CliRunner().invoke(cli, ["import", second, "--checkpoint", checkpoint])
+    assert result.exit_code == 1
+    assert "belongs to" in result.output
+    assert [drug["name"] for drug in fake_postgrest.tables["drugs"]] == ["Aspirin", "Ibuprofen"]
+
+def test_failed_record_is_retried_on_resume(fake_postgrest, fail_inserts, tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / "import.ckpt")
+    path = _dump(tmp_path, ["Aspirin", "Ibuprofen"])
+    fail_inserts("drugs")
+    result = CliRunner().invoke(cli, ["import", path, "--checkpoint", checkpoint])
+    assert result.exit_code == 1
+    assert "retry" in result.output
+
+    monkeypatch.undo()
+    assert CliRunner().invoke(cli, ["import", path, "--checkpoint", checkpoint]).exit_code == 0
+    assert [drug["name"] for drug in fake_postgrest.tables["drugs"]] == ["Aspirin", "Ibuprofen"]
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from medication_cli.drug_index import FULL_RELOAD_EVERY, DrugIndex
+from medication_cli.imprints import ImprintIndex
+
+def _codes(index, code):
+    return [result["name"] for result in index.lookup(code)]
+
+def test_refresh_picks_up_changed_drugs_and_edited_child_rows(fake_postgrest):
+    fake_postgrest.tables["drugs"] = [{"id": "d1", "name": "Ibuprofen"}]
+    fake_postgrest.tables["drug_imprints"] = [{"id": "i1", "drug_id": "d1", "imprint_code": "IBU 200"}]
+    index = ImprintIndex()
+    index.load()
+    assert _codes(index, "IBU200") == ["Ibuprofen"]
+
+    # A renamed drug is re-read on the next refresh
+    fake_postgrest.tables["drugs"][0]["name"] = "Advil"
+    index.refresh()
+    assert _codes(index, "IBU200") == ["Advil"]
+
+    # A child row edited in place shows up by the next full reload
+    fake_postgrest.tables["drug_imprints"][0]["imprint_code"] = "I-2"
+    for _ in range(FULL_RELOAD_EVERY - 1):
+        index.refresh()
+    assert _codes(index, "I2") == ["Advil"]
+    assert _codes(index, "IBU200") == []
+
+def test_concurrent_stale_checks_start_one_refresh(fake_postgrest, monkeypatch):
+    fake_postgrest.tables["drugs"] = [{"id": "d1", "name": "Ibuprofen"}]
+    index = ImprintIndex(refresh_interval=0.01)
+    index.load()
+    index._loaded_at -= 1
+    release = threading.Event()
+    monkeypatch.setattr(index, "refresh", lambda client=None: release.wait(5))
+
+    threads = [index.refresh_if_stale() for _ in range(5)]
+    release.set()
+    started = [thread for thread in threads if thread is not None]
+    assert len(started) == 1
+    started[0].join()
+
+def test_subclass_missing_a_hook_fails_when_instantiated():
+    class Incomplete(DrugIndex):
+        def _clear(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
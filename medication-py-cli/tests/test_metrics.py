@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from medication_cli.metrics import Registry
+from medication_cli.server import pre_fork
+
+def test_process_labels_are_added_to_every_sample():
+    registry = Registry()
+    registry.counter("requests_total", "Requests").inc(route="/medications")
+    registry.histogram("duration_seconds", "Duration", buckets=(1.0,)).observe(0.5)
+    registry.register_collector(lambda: [("entries", "gauge", "Entries", {"cache": "response"}, 3)])
+
+    registry.label_process(worker=3)
+    samples = [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+    assert 'requests_total{worker="3",route="/medications"} 1' in samples
+    assert 'duration_seconds_bucket{worker="3",le="1.0"} 1' in samples
+    assert 'entries{worker="3",cache="response"} 3' in samples
+    assert all('worker="3"' in line for line in samples)
+
+def test_restarted_workers_reuse_free_slots():
+    server = SimpleNamespace(WORKERS={})
+    for pid in (100, 101, 102):
+        worker = SimpleNamespace()
+        pre_fork(server, worker)
+        server.WORKERS[pid] = worker
+    assert [worker.slot for worker in server.WORKERS.values()] == [0, 1, 2]
+
+    del server.WORKERS[101]
+    replacement = SimpleNamespace()
+    pre_fork(server, replacement)
+    assert replacement.slot == 1
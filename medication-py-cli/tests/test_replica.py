@@ -0,0 +1,75 @@
+import pytest
+
+from medication_cli import replica as replica_module
+from medication_cli.replica import Replica
+
+def _medication(row_id, name, updated_at):
+    return {"id": row_id, "name": name, "updated_at": updated_at}
+
+@pytest.fixture
+def replica(tmp_path):
+    return Replica(str(tmp_path / "replica.sqlite3"))
+
+def test_sync_pulls_only_rows_changed_since_the_last_sync(fake_postgrest, replica):
+    fake_postgrest.tables["medications"] = [_medication(1, "Aspirin", "2024-01-01T00:00:00+00:00"),
+                                            _medication(2, "Ibuprofen", "2024-01-01T00:00:00+00:00")]
+    fake_postgrest.tables["drugs"] = []
+    assert replica.sync()["medications"] == {"synced": 2, "removed": 0}
+
+    assert replica.sync()["medications"] == {"synced": 0, "removed": 0}
+
+    fake_postgrest.update("medications", {"name": "Advil"}, [("id", "eq.2")])
+    assert replica.sync()["medications"] == {"synced": 1, "removed": 0}
+    assert replica.get("medications", "2")["name"] == "Advil"
+    assert replica.stats()["tables"]["medications"]["mode"] == "incremental"
+
+def test_full_sync_swaps_each_table_in_one_transaction(fake_postgrest, replica, monkeypatch):
+    fake_postgrest.tables["medications"] = [_medication(i, f"Med {i}", "2024-01-01T00:00:00+00:00")
+                                            for i in range(1, 6)]
+    fake_postgrest.tables["drugs"] = []
+    replica.sync()
+
+    # Upstream loses one row and gains another; the copy is read in several pages
+    fake_postgrest.tables["medications"][0:1] = [_medication(9, "Med 9", "2024-02-01T00:00:00+00:00")]
+    monkeypatch.setattr(replica_module, "SYNC_PAGE_SIZE", 2)
+    seen = []
+    select = fake_postgrest.select
+
+    def watching_select(table, params):
+        if table == "medications":
+            seen.append(len(replica.search("medications", limit=100)))
+        return select(table, params)
+
+    monkeypatch.setattr(fake_postgrest, "select", watching_select)
+    result = replica.sync(full=True)
+
+    assert seen and all(count == 5 for count in seen)
+    assert result["medications"] == {"synced": 5, "removed": 1}
+    assert sorted(row["id"] for row in replica.search("medications", limit=100)) == [2, 3, 4, 5, 9]
+    assert replica.stats()["tables"]["medications"]["mode"] == "full"
+
+def test_sync_without_updated_at_column_fails_instead_of_copying(fake_postgrest, replica, monkeypatch):
+    select = fake_postgrest.select
+
+    def no_updated_at(table, params):
+        if any("updated_at" in key or "updated_at" in value for key, value in params):
+            error = RuntimeError("column medications.updated_at does not exist")
+            error.code = "42703"
+            raise error
+        return select(table, params)
+
+    monkeypatch.setattr(fake_postgrest, "select", no_updated_at)
+    with pytest.raises(RuntimeError, match="replica schema"):
+        replica.sync()
+    assert not replica.has_data("medications")
+
+def test_only_one_replica_per_file_claims_the_syncer_lock(tmp_path):
+    path = str(tmp_path / "replica.sqlite3")
+    first, second = Replica(path), Replica(path)
+    assert first.claim_syncer()
+    assert not second.claim_syncer()
+
+    # The lock goes to another process once the holder lets go
+    first.reset()
+    assert second.claim_syncer()
+    assert second.stats()["syncer"]
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import pytest
+
+from medication_cli.retry import CircuitBreaker, DeadlineExceeded, execute, execute_async
+
+def test_slow_request_stops_at_the_deadline(fake_postgrest, monkeypatch):
+    from medication_cli.supabase_client import supabase
+
+    monkeypatch.setattr(fake_postgrest, "latency_ms", 2000)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        execute(supabase.table("medications").select("*").execute, deadline=0.3, circuit=CircuitBreaker())
+    assert time.monotonic() - started < 1.5
+
+def test_slow_async_request_stops_at_the_deadline(fake_postgrest, monkeypatch):
+    from medication_cli.supabase_client import create_async_client
+
+    async def run():
+        client = await create_async_client()
+        await execute_async(client.table("medications").select("*").execute, deadline=0.3,
+                            circuit=CircuitBreaker())
+
+    monkeypatch.setattr(fake_postgrest, "latency_ms", 2000)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.monotonic() - started < 1.5
@@ -0,0 +1,68 @@
+import time
+
+from medication_cli.search_index import SearchIndex
+
+def _insert(server, *names):
+    server.tables.setdefault("medications", []).extend({"id": name.lower(), "name": name} for name in names)
+
+def test_stale_index_is_rebuilt_from_the_table(fake_postgrest):
+    _insert(fake_postgrest, "Ibuprofen")
+    index = SearchIndex(refresh_interval=0.01)
+    index.load()
+
+    _insert(fake_postgrest, "Naproxen")
+    time.sleep(0.02)
+    index.refresh_if_stale().join()
+    assert [row["name"] for row in index.search("naproxen", fuzzy=False)] == ["Naproxen"]
+
+def test_writes_during_a_rebuild_survive_it(fake_postgrest, monkeypatch):
+    _insert(fake_postgrest, "Ibuprofen")
+    index = SearchIndex()
+    select = fake_postgrest.select
+
+    def select_then_write(table, params):
+        rows = select(table, params)
+        index.upsert({"id": "written", "name": "Ketoprofen"})
+        return rows
+
+    monkeypatch.setattr(fake_postgrest, "select", select_then_write)
+    index.load()
+    assert [row["name"] for row in index.search("ketoprofen", fuzzy=False)] == ["Ketoprofen"]
+
+def test_refresh_reads_only_changed_rows_and_periodically_reloads(fake_postgrest):
+    from medication_cli.drug_index import FULL_RELOAD_EVERY
+
+    fake_postgrest.insert("medications", [{"id": "1", "name": "Ibuprofen"}, {"id": "2", "name": "Aspirin"}], [], "")
+    index = SearchIndex()
+    index.load()
+
+    fake_postgrest.update("medications", {"name": "Advil"}, [("id", "eq.1")])
+    assert index.refresh() == {"changed": 1}
+    assert [row["name"] for row in index.search("advil", fuzzy=False)] == ["Advil"]
+    assert index.refresh() == {"changed": 0}
+
+    # Deletions made elsewhere are dropped by the periodic full reload
+    fake_postgrest.delete("medications", [("id", "eq.2")])
+    for _ in range(FULL_RELOAD_EVERY - 3):
+        index.refresh()
+    assert index.search("aspirin", fuzzy=False)
+    assert index.refresh()["reloaded"] == 1
+    assert index.search("aspirin", fuzzy=False) == []
+
+def test_table_without_updated_at_is_reloaded_in_full(fake_postgrest, monkeypatch):
+    _insert(fake_postgrest, "Ibuprofen")
+    index = SearchIndex()
+    index.load()
+    select = fake_postgrest.select
+
+    def no_updated_at(table, params):
+        if any("updated_at" in value for _, value in params):
+            error = ValueError("column medications.updated_at does not exist")
+            error.code = "42703"
+            raise error
+        return select(table, params)
+
+    monkeypatch.setattr(fake_postgrest, "select", no_updated_at)
+    _insert(fake_postgrest, "Naproxen")
+    assert index.refresh()["reloaded"] == 2
+    assert [row["name"] for row in index.search("naproxen", fuzzy=False)] == ["Naproxen"]
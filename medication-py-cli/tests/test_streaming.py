@@ -0,0 +1,33 @@
+import pytest
+
+from medication_cli.streaming import iter_json_records
+
+def _records(tmp_path, text, name="drugs.json", **kwargs):
+    path = tmp_path / name
+    path.write_text(text)
+    return [(record.data, record.error) for record in iter_json_records(str(path), **kwargs)]
+
+def test_ndjson_saved_as_json_yields_every_record(tmp_path):
+    assert _records(tmp_path, '{"a": 1}\n{"b": 2}\n') == [({"a": 1}, None), ({"b": 2}, None)]
+
+def test_data_after_a_single_object_is_rejected(tmp_path):
+    [(data, error)] = _records(tmp_path, '{\n  "a": 1\n}\n{"b": 2}\n')
+    assert data is None and "extra data" in error
+
+@pytest.mark.parametrize("text", ['[{"a": 1} {"b": 2}]', '[{"a": 1},, {"b": 2}]', '[{"a": 1},]'])
+def test_array_elements_need_separators(tmp_path, text):
+    records = _records(tmp_path, text)
+    assert records[0] == ({"a": 1}, None)
+    assert records[-1][1] is not None
+
+def test_resuming_a_finished_import_yields_nothing(tmp_path):
+    path = tmp_path / "drug.json"
+    path.write_text('{\n  "a": 1\n}\n')
+    [record] = iter_json_records(str(path))
+    assert list(iter_json_records(str(path), start_offset=record.offset, start_index=record.index + 1)) == []
+
+def test_array_resumes_after_last_record(tmp_path):
+    path = tmp_path / "drugs.json"
+    path.write_text('[{"a": 1}, {"b": 2}]')
+    first = next(iter_json_records(str(path)))
+    assert [r.data for r in iter_json_records(str(path), start_offset=first.offset, start_index=1)] == [{"b": 2}]
@@ -0,0 +1,49 @@
+import pytest
+
+from medication_cli.export import import_format_to_rows
+from medication_cli.upsert import CREATED, UNCHANGED, UPDATED, DrugUpserter, IncompleteImport
+
+def test_hash_is_stored_only_after_every_child_row(fake_postgrest, fail_inserts, example_drug, monkeypatch):
+    interactions = len(import_format_to_rows(example_drug)[1]["drug_interactions"])
+    fail_inserts("drug_interactions")
+    with pytest.raises(IncompleteImport) as failure:
+        DrugUpserter().upsert(example_drug)
+
+    assert failure.value.missing == {"drug_interactions": interactions}
+    drugs = fake_postgrest.tables["drugs"]
+    assert len(drugs) == 1 and drugs[0].get("content_hash") is None
+    assert not fake_postgrest.tables.get("drug_interactions")
+
+    # Once the table accepts rows again the drug is completed instead of skipped
+    monkeypatch.undo()
+    result = DrugUpserter().upsert(example_drug)
+    assert result["status"] == UPDATED
+    assert result["inserted"] == interactions
+    assert len(fake_postgrest.tables["drug_interactions"]) == interactions
+    assert fake_postgrest.tables["drugs"][0]["content_hash"]
+
+    assert DrugUpserter().upsert(example_drug)["status"] == UNCHANGED
+
+def test_created_reports_rows_written(fake_postgrest, example_drug):
+    result = DrugUpserter().upsert(example_drug)
+    written = sum(len(rows) for table, rows in fake_postgrest.tables.items() if table != "drugs")
+    assert result["status"] == CREATED
+    assert result["inserted"] == written > 0
+
+def test_partial_update_is_rediffed_when_the_source_reverts(fake_postgrest, fail_inserts, example_drug, monkeypatch):
+    DrugUpserter().upsert(example_drug)
+    interactions = len(fake_postgrest.tables["drug_interactions"])
+
+    changed = dict(example_drug, name=example_drug["name"] + " XR")
+    changed["interactions"] = dict(example_drug["interactions"], major=["Aspirin"])
+    fail_inserts("drug_interactions")
+    with pytest.raises(IncompleteImport):
+        DrugUpserter().upsert(changed)
+    assert fake_postgrest.tables["drugs"][0].get("content_hash") is None
+
+    # Going back to the original record restores it instead of skipping it as unchanged
+    monkeypatch.undo()
+    result = DrugUpserter().upsert(example_drug)
+    assert result["status"] == UPDATED
+    assert fake_postgrest.tables["drugs"][0]["name"] == example_drug["name"]
+    assert len(fake_postgrest.tables["drug_interactions"]) == interactions